@@ -0,0 +1,655 @@
+#!/usr/bin/env python
+
+
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+from timeit import default_timer
+
+import numpy as np
+
+import isentropic_flow as ise_flow
+import normal_shock_wave as nsw
+import expansion_wave as exp_wave
+import solvers
+import sweep
+from gas import GasModel
+from instrument import instrument
+from sampling import adaptive_profile
+from config import WindTunnelConfig, nozzle_conditions
+from wind_tunnel import WindTunnel
+from combination import Combination
+from report import Report, WindTunnelReportCreator
+
+
+SIZES = (10**3, 10**4, 10**5, 10**6, 10**7)
+
+# Python loops are only timed up to this many points, larger sizes are
+# extrapolated linearly from the per-point cost.
+LOOP_LIMIT = 10**5
+
+FORWARD_RELATIONS = [
+    ('ise_flow.m2p', ise_flow.m2p, (1E-2, 5.)),
+    ('ise_flow.m2rho', ise_flow.m2rho, (1E-2, 5.)),
+    ('ise_flow.m2t', ise_flow.m2t, (1E-2, 5.)),
+    ('ise_flow.m2a', ise_flow.m2a, (1E-2, 5.)),
+    ('nsw.m2m2', nsw.m2m2, (1., 5.)),
+    ('nsw.m2p', nsw.m2p, (1., 5.)),
+    ('nsw.m2rho', nsw.m2rho, (1., 5.)),
+    ('nsw.m2t', nsw.m2t, (1., 5.)),
+    ('nsw.m2p0', nsw.m2p0, (1., 5.)),
+    ('exp_wave.nu_in_rad', exp_wave.nu_in_rad, (1., 5.)),
+    ('exp_wave.nu_in_deg', exp_wave.nu_in_deg, (1., 5.)),
+]
+
+
+# name, default inverse, brentq reference, forward relation, Mach range
+INVERSE_RELATIONS = [
+    ('ise_flow.a2m(sup)', lambda a: ise_flow.a2m(a, 1),
+     lambda a: ise_flow.a2m(a, 1, method='brentq'),
+     ise_flow.m2a, (1., 5.)),
+    ('ise_flow.a2m(sub)', lambda a: ise_flow.a2m(a, 0),
+     lambda a: ise_flow.a2m(a, 0, method='brentq'),
+     ise_flow.m2a, (1E-2, 1.)),
+    ('ise_flow.ap2m', ise_flow.ap2m,
+     lambda ap: ise_flow.ap2m(ap, method='brentq'),
+     lambda m: ise_flow.m2a(m)*ise_flow.m2p(m), (1E-2, 5.)),
+    ('ise_flow.p2m', ise_flow.p2m,
+     lambda p: ise_flow.p2m(p, method='brentq'),
+     ise_flow.m2p, (1E-2, 5.)),
+    ('ise_flow.rho2m', ise_flow.rho2m,
+     lambda rho: ise_flow.rho2m(rho, method='brentq'),
+     ise_flow.m2rho, (1E-2, 5.)),
+    ('ise_flow.t2m', ise_flow.t2m,
+     lambda t: ise_flow.t2m(t, method='brentq'),
+     ise_flow.m2t, (1E-2, 5.)),
+]
+
+# brentq is far slower per point than the forward relations.
+INVERSE_SIZES = (10**3, 10**4, 10**5, 10**6)
+INVERSE_LOOP_LIMIT = 10**4
+
+
+def best_of(func, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = default_timer()
+        func()
+        best = min(best, default_timer()-start)
+    return best
+
+
+def loop_time(func, ms, limit=LOOP_LIMIT):
+    n = min(len(ms), limit)
+    sample = ms[:n].tolist()
+
+    def run():
+        for m in sample:
+            func(m)
+    return best_of(run, repeat=1) * len(ms) / n
+
+
+def bench_forward_relations(sizes=SIZES):
+    rows = []
+    for name, func, (lo, hi) in FORWARD_RELATIONS:
+        for n in sizes:
+            ms = np.linspace(lo, hi, n)
+            t_loop = loop_time(func, ms)
+            t_vec = best_of(lambda: func(ms))
+            rows.append((name, n, t_loop, t_vec))
+    return rows
+
+
+def bench_inverse_relations(sizes=INVERSE_SIZES):
+    rows = []
+    for name, inverse, reference, forward, (lo, hi) in INVERSE_RELATIONS:
+        for n in sizes:
+            ys = forward(np.linspace(lo, hi, n))
+            t_loop = loop_time(reference, ys, INVERSE_LOOP_LIMIT)
+            t_vec = best_of(lambda: inverse(ys))
+            rows.append((name, n, t_loop, t_vec))
+    return rows
+
+
+def inverse_errors(n=10**4):
+    errors = []
+    for name, inverse, reference, forward, (lo, hi) in INVERSE_RELATIONS:
+        ys = forward(np.linspace(lo, hi, n))
+        errors.append((name, np.max(np.abs(inverse(ys)-reference(ys)))))
+    return errors
+
+
+TABLE_RELATIONS = [
+    ('ise_flow.a2m(sup)', lambda a, method: ise_flow.a2m(a, 1, method),
+     ise_flow.m2a, (1., 5.)),
+    ('ise_flow.a2m(sub)', lambda a, method: ise_flow.a2m(a, 0, method),
+     ise_flow.m2a, (1E-2, 1.)),
+    ('ise_flow.ap2m', ise_flow.ap2m,
+     lambda m: ise_flow.m2a(m)*ise_flow.m2p(m), (1E-2, 5.)),
+    ('nsw.p02m', nsw.p02m, nsw.m2p0, (1.1, 5.)),
+    ('nsw.m22m1', nsw.m22m1, nsw.m2m2, (1., 5.)),
+]
+
+
+def bench_tables(n=10**6):
+    rows = []
+    for name, inverse, forward, (lo, hi) in TABLE_RELATIONS:
+        ms = np.linspace(lo, hi, n)
+        ys = forward(ms)
+        inverse(ys[:1], 'table')
+        for method in ('exact', 'table', 'table+polish'):
+            t = best_of(lambda: inverse(ys, method))
+            error = np.nanmax(np.abs(inverse(ys, method)-ms)/ms)
+            rows.append((name, method, n, t, error))
+    return rows
+
+
+def demo_combination(pb=0.99E6):
+    nozzle = WindTunnel(2.4, 0.24, 1E6, 300, 20, 5, 5, 1, pb)
+    com = Combination(nozzle)
+    com.add_test_section(5)
+    com.add_diffuser(0.17, 5, 5, 5, pb)
+    return com
+
+
+def bench_diffuser_profile(n=10**4):
+    # Diffuser with a normal shock, i.e. nozzle working condition 6.
+    pb = ise_flow.m2p(2.4) * 1E6
+    diffuser = demo_combination(pb).components[2]
+    xs = np.linspace(0, diffuser.t_len, n)
+    t_loop = best_of(lambda: [diffuser.x2p(x) for x in xs], repeat=1)
+    t_vec = best_of(lambda: diffuser.profile(xs))
+    return [('Diffuser.x2p/profile', n, t_loop, t_vec)]
+
+
+def bench_back_pressure_sweep(n_pb=400, n_x=1000):
+    nozzle = demo_combination().components[0]
+    pbs = np.linspace(0.02E6, 0.99E6, n_pb)
+    xs = np.linspace(0, nozzle.t_len, n_x)
+
+    def loop():
+        for pb in pbs:
+            nozzle.change_back_pressure(pb)
+            nozzle.profile(xs)
+    t_loop = best_of(loop, repeat=1)
+    t_vec = best_of(lambda: sweep.back_pressure_sweep(nozzle, pbs, xs))
+    return [('back_pressure_sweep', n_pb*n_x, t_loop, t_vec)]
+
+
+DESIGN_GRID = {'design_mach': np.linspace(1.5, 3, 16),
+               'test_section_area': np.linspace(0.2, 0.3, 8),
+               'diffuser_at': np.linspace(0.1, 0.2, 8)}
+
+
+def bench_design_sweep(workers=(1, 2, 4, 8), n_stations=1000):
+    rows = []
+    for n in workers:
+        t = best_of(lambda: sweep.design_sweep(DESIGN_GRID, n_stations,
+                                               workers=n), repeat=1)
+        rows.append((n, t))
+    return rows
+
+
+def bench_shared_design_sweep(workers=2, n_stations=10000):
+    rows = []
+    for shared in (False, True):
+        t = best_of(lambda: sweep.design_sweep(DESIGN_GRID, n_stations,
+                                               workers=workers,
+                                               shared=shared), repeat=1)
+        rows.append((shared, t))
+    return rows
+
+
+def bench_continuation(n=1000):
+    # brentq iterations per station of a nozzle profile marched with and
+    # without continuation, for a subsonic and a supersonic nozzle.
+    rows = []
+    for pb in (0.99E6, ise_flow.m2p(2.4)*1E6):
+        nozzle = demo_combination(pb).components[0]
+        xs = np.linspace(0, nozzle.t_len, n)
+        for method in ('brentq', 'continuation'):
+            solvers.iterations.clear()
+            t = best_of(lambda: nozzle.profile(xs, method), repeat=1)
+            rows.append((nozzle.wc, method,
+                         solvers.iterations[method]/n, t))
+    return rows
+
+
+def bench_instrument_overhead(n=10**4):
+    # Scalar x2m with instrumentation off, on, and with the bare methods.
+    nozzle = demo_combination().components[0]
+    xs = np.linspace(0, nozzle.t_len, n).tolist()
+    bare = type(nozzle).x2m.__wrapped__
+    rows = [('bare', best_of(lambda: [bare(nozzle, x) for x in xs])),
+            ('off', best_of(lambda: [nozzle.x2m(x) for x in xs]))]
+    with instrument(summary=False):
+        rows.append(('on', best_of(lambda: [nozzle.x2m(x) for x in xs])))
+    return rows
+
+
+def bench_batched_gas(n_gas=16, n=10**4):
+    # A loop over gases against one call broadcast over gamma.
+    gammas = np.linspace(1.1, 5/3, n_gas)
+    batched = GasModel(gammas)
+    gases = [GasModel(g) for g in gammas]
+    ms = np.linspace(1.01, 5, n)
+    rows = []
+    for name, forward, inverse in [
+            ('ise_flow.m2p', ise_flow.m2p, None),
+            ('ise_flow.a2m(sup)', ise_flow.m2a,
+             lambda a, gas: ise_flow.a2m(a, 1, gas=gas))]:
+        func = inverse or forward
+        ys = [forward(ms, gas) if inverse else ms for gas in gases]
+        y = forward(ms[:, None], batched) if inverse else ms[:, None]
+        t_loop = best_of(lambda: [func(v, gas) for v, gas in zip(ys, gases)])
+        t_vec = best_of(lambda: func(y, batched))
+        rows.append((name, n*n_gas, t_loop, t_vec))
+    return rows
+
+
+def bench_operating_change(n=1000):
+    # Profile after a change of pb against a combination built anew.
+    pbs = (0.99E6, ise_flow.m2p(2.4)*1E6)
+    com = demo_combination(pbs[0])
+    xs = np.linspace(0, com.t_len, n)
+    state = {'i': 0}
+
+    def change():
+        state['i'] += 1
+        com.change_back_pressure(pbs[state['i'] % 2])
+        return com.profile(xs)
+    t_change = best_of(change, repeat=10)
+    t_build = best_of(lambda: demo_combination(pbs[1]).profile(xs),
+                      repeat=10)
+    return t_change, t_build
+
+
+def bench_back_pressure_ramp(n=10**6, chunksize=sweep.RAMP_CHUNKSIZE):
+    # Start-up and shut-down ramp through all seven working conditions.
+    nozzle = demo_combination().components[0]
+    ratio = 1 - 0.98*np.sin(np.linspace(0, np.pi, n))
+    pbs = ratio * nozzle.p01
+
+    def run():
+        return sum(len(c.events)
+                   for c in sweep.back_pressure_ramp(nozzle, pbs, chunksize))
+    t = best_of(run, repeat=1)
+    return n, run(), t
+
+
+def bisect_pb_for_shock_at(nozzle, x, xtol=1E-9):
+    # The search by hand: change pb until xns_34 is at x. The shock moves
+    # downstream as pb falls from the limiting case to the shock at the exit.
+    pl, pns, pd = nozzle.thresholds
+    lo, hi = pns*nozzle.p01, pl*nozzle.p01
+    while True:
+        pb = (lo+hi) / 2
+        nozzle.change_back_pressure(pb)
+        xns = nozzle.xns_34
+        if abs(xns-x) < xtol or hi-lo < 1E-9*pb:
+            return pb
+        if xns < x:
+            hi = pb
+        else:
+            lo = pb
+
+
+def bench_pb_for_shock_at(n_bisect=20, n=10**4):
+    # Back pressure for shock stations by bisection, by the direct inverse
+    # station by station, and by the direct inverse on an array.
+    nozzle = demo_combination().components[0]
+    xs = np.linspace(nozzle.con_len+0.02, nozzle.t_len-0.02, n_bisect)
+    pbs = [bisect_pb_for_shock_at(nozzle, x) for x in xs]
+    direct = nozzle.pb_for_shock_at(xs)
+    error = np.max(np.abs(direct-pbs) / pbs)
+
+    many = np.linspace(nozzle.con_len, nozzle.t_len, n)
+    t_bisect = best_of(lambda: [bisect_pb_for_shock_at(nozzle, x)
+                                for x in xs], repeat=1)
+    t_scalar = best_of(lambda: [nozzle.pb_for_shock_at(x) for x in xs])
+    t_array = best_of(lambda: nozzle.pb_for_shock_at(many))
+    return [('bisection', t_bisect/n_bisect),
+            ('pb_for_shock_at', t_scalar/n_bisect),
+            ('pb_for_shock_at array', t_array/n)], error
+
+
+def _allocated(make):
+    # Bytes still allocated by the objects make() returns.
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        objects = make()
+        size = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    del objects
+    return size
+
+
+def nozzle_designs(n):
+    base = WindTunnelConfig.from_model(demo_combination().components[0])
+    mds = np.linspace(1.5, 3, n)
+    pbs = np.linspace(0.3E6, 0.99E6, n)
+    return [base._replace(design_mach=md, back_pressure=pb)
+            for md, pb in zip(mds.tolist(), pbs.tolist())]
+
+
+def bench_config_memory(n=10**5):
+    # Bytes per nozzle design as WindTunnel models, before and after their
+    # working condition is evaluated, as config records and as one
+    # structured array, and the time to classify them all.
+    configs = nozzle_designs(n)
+    records = WindTunnelConfig.to_records(configs)
+
+    # Built from new records, so that every row counts the floats too.
+    def evaluated():
+        tunnels = [c.build() for c in nozzle_designs(n)]
+        for tunnel in tunnels:
+            tunnel.wc
+        return tunnels
+    rows = [('WindTunnel', _allocated(
+                lambda: [c.build() for c in nozzle_designs(n)])),
+            ('WindTunnel.wc', _allocated(evaluated)),
+            ('WindTunnelConfig', _allocated(lambda: nozzle_designs(n))),
+            ('records', _allocated(
+                lambda: WindTunnelConfig.to_records(configs)))]
+    rows = [(name, size/n) for name, size in rows]
+
+    m = min(n, LOOP_LIMIT//10)
+    t_loop = best_of(lambda: [c.build().wc for c in configs[:m]], 1) * n/m
+    t_vec = best_of(lambda: nozzle_conditions(records))
+    return rows, ('nozzle_conditions', n, t_loop, t_vec)
+
+
+def report_root_finds(steps=1000):
+    # Root finds and wall time of WindTunnelReportCreator.generate() with
+    # and without the single pass.
+    cwd = os.getcwd()
+    directory = tempfile.mkdtemp()
+    rows = []
+    try:
+        os.chdir(directory)
+        for single_pass in (False, True):
+            creator = WindTunnelReportCreator(demo_combination(), Report())
+            solvers.counter.clear()
+            start = default_timer()
+            creator.generate(steps, single_pass)
+            elapsed = default_timer() - start
+            rows.append((single_pass, sum(solvers.counter.values()), elapsed))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+    return rows
+
+
+def _interpolation_error(profile, reference):
+    # Largest error of the linear interpolation of profile, relative to the
+    # range of each quantity.
+    error = 0
+    for q in ('m', 'p', 't', 'rho'):
+        exact = getattr(reference, q)
+        values = np.interp(reference.x, profile.x, getattr(profile, q))
+        error = max(error, np.max(np.abs(values-exact))/np.ptp(exact))
+    return error
+
+
+def bench_adaptive_sampling(pbs=(0.99E6, ise_flow.m2p(2.4)*1E6), steps=1000,
+                            n_reference=2*10**5):
+    # Root finds and interpolation error of uniform and adaptive stations.
+    rows = []
+    for pb in pbs:
+        com = demo_combination(pb)
+        reference = com.profile(np.union1d(
+            np.linspace(0, com.t_len, n_reference), com.breakpoints))
+        for name, sample in [
+                ('uniform', lambda: com.profile(np.linspace(0, com.t_len,
+                                                            steps))),
+                ('adaptive', lambda: adaptive_profile(com))]:
+            solvers.counter.clear()
+            profile = sample()
+            rows.append((pb, name, len(profile.x),
+                         sum(solvers.counter.values()),
+                         _interpolation_error(profile, reference)))
+    return rows
+
+
+# The suite below times a fixed set of cases and saves the best time of each
+# to JSON, so a run can be compared with a stored baseline. Cases are named
+# group/function/variant, and --filter selects them by substring.
+SUITE_VERSION = 1
+SCALAR_POINTS = 1000
+ARRAY_POINTS = 10**5
+PROFILE_SIZES = (10**3, 10**4, 10**5)
+X2M_STATIONS = 200
+IMPORT_MODULES = ('isentropic_flow', 'wind_tunnel', 'combination', 'report')
+THRESHOLD = 0.2
+
+SUITE_INVERSES = [
+    ('ise_flow.a2m(sup)', lambda a: ise_flow.a2m(a, 1), ise_flow.m2a,
+     (1., 5.)),
+    ('ise_flow.a2m(sub)', lambda a: ise_flow.a2m(a, 0), ise_flow.m2a,
+     (1E-2, 1.)),
+    ('ise_flow.ap2m', ise_flow.ap2m,
+     lambda m: ise_flow.m2a(m)*ise_flow.m2p(m), (1E-2, 5.)),
+    ('ise_flow.p2m', ise_flow.p2m, ise_flow.m2p, (1E-2, 5.)),
+    ('ise_flow.rho2m', ise_flow.rho2m, ise_flow.m2rho, (1E-2, 5.)),
+    ('ise_flow.t2m', ise_flow.t2m, ise_flow.m2t, (1E-2, 5.)),
+    ('nsw.p02m', nsw.p02m, nsw.m2p0, (1.1, 5.)),
+    ('nsw.m22m1', nsw.m22m1, nsw.m2m2, (1., 5.)),
+]
+
+
+def operating_pressures(nozzle):
+    # One back pressure in each working condition of nozzle.
+    pl, pns, pd = nozzle.thresholds
+    ratios = {1: (1+pl)/2, 2: pl, 3: (pl+pns)/2, 4: pns, 5: (pns+pd)/2,
+              6: pd, 7: pd/2}
+    return dict((wc, ratio*nozzle.p01) for wc, ratio in ratios.items())
+
+
+def _relation_cases(group, name, func, ys):
+    sample = ys[:SCALAR_POINTS].tolist()
+    yield ('%s/%s/scalar' % (group, name),
+           lambda: [func(y) for y in sample], len(sample))
+    yield ('%s/%s/array' % (group, name), lambda: func(ys), len(ys))
+
+
+def _generate(steps):
+    def run():
+        cwd = os.getcwd()
+        directory = tempfile.mkdtemp()
+        try:
+            os.chdir(directory)
+            WindTunnelReportCreator(demo_combination(), Report()).generate(
+                steps)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(directory)
+    return run
+
+
+def _import(module):
+    # Start-up of a fresh interpreter that imports module, as paid by every
+    # short job.
+    import subprocess
+    import sys
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return lambda: subprocess.check_call(
+        [sys.executable, '-c', 'import %s' % module], cwd=directory)
+
+
+def suite_cases():
+    """Yield the name, the function to time and the number of points of
+    every case of the suite."""
+    for name, func, (lo, hi) in FORWARD_RELATIONS:
+        ms = np.linspace(lo, hi, ARRAY_POINTS)
+        for case in _relation_cases('forward', name, func, ms):
+            yield case
+    for name, inverse, forward, (lo, hi) in SUITE_INVERSES:
+        ys = forward(np.linspace(lo, hi, ARRAY_POINTS))
+        for case in _relation_cases('inverse', name, inverse, ys):
+            yield case
+
+    pbs = operating_pressures(demo_combination().components[0])
+    for wc, pb in sorted(pbs.items()):
+        nozzle = WindTunnel(2.4, 0.24, 1E6, 300, 20, 5, 5, 1, pb)
+        xs = np.linspace(0, nozzle.t_len, X2M_STATIONS).tolist()
+        yield ('x2m/WindTunnel/wc%d' % wc,
+               lambda nozzle=nozzle, xs=xs: [nozzle.x2m(x) for x in xs],
+               len(xs))
+    # The diffuser can only follow a nozzle in working condition 1, 2 or 6.
+    for wc in (1, 2, 6):
+        diffuser = demo_combination(pbs[wc]).components[2]
+        xs = np.linspace(0, diffuser.t_len, X2M_STATIONS).tolist()
+        yield ('x2m/Diffuser/wc%d' % wc,
+               lambda diffuser=diffuser, xs=xs: [diffuser.x2m(x)
+                                                 for x in xs],
+               len(xs))
+
+    com = demo_combination()
+    for n in PROFILE_SIZES:
+        xs = np.linspace(0, com.t_len, n)
+        yield ('profile/Combination/%d' % n,
+               lambda xs=xs: com.profile(xs), n)
+    yield 'report/generate/1000', _generate(1000), 1000
+    for module in IMPORT_MODULES:
+        yield 'import/%s' % module, _import(module), 1
+
+
+def run_suite(repeat=5, pattern=None):
+    results = {}
+    for name, func, points in suite_cases():
+        if pattern and pattern not in name:
+            continue
+        func()
+        t = best_of(func, repeat)
+        results[name] = {'time': t, 'points': points}
+    return results
+
+
+def metadata():
+    import platform
+    import scipy
+    return {'suite_version': SUITE_VERSION,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'processor': platform.processor()}
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Return name, baseline time, time and ratio of every case slower than
+    the baseline by more than threshold."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ratio = result['time'] / baseline[name]['time']
+        if ratio > 1+threshold:
+            regressions.append((name, baseline[name]['time'],
+                                result['time'], ratio))
+    return regressions
+
+
+def print_suite(results, baseline=None):
+    print('%-36s %8s %12s %12s %8s' %
+          ('case', 'points', 'time [s]', 'per point', 'ratio'))
+    for name, result in sorted(results.items()):
+        ratio = ''
+        if baseline and name in baseline:
+            ratio = '%8.2f' % (result['time']/baseline[name]['time'])
+        print('%-36s %8d %12.4g %12.4g %8s' %
+              (name, result['points'], result['time'],
+               result['time']/result['points'], ratio))
+
+
+def print_extended():
+    print_rows(bench_forward_relations())
+    print_rows(bench_inverse_relations())
+    for name, error in inverse_errors():
+        print('%-22s max |M - M_brentq| = %.3g' % (name, error))
+    for name, method, n, t, error in bench_tables():
+        print('%-22s %-14s %10d %12.4g %12.3g' % (name, method, n, t, error))
+    print_rows(bench_diffuser_profile())
+    print_rows(bench_back_pressure_sweep())
+    for n, t in bench_design_sweep():
+        print('design_sweep %d workers %8.3f s' % (n, t))
+    for shared, t in bench_shared_design_sweep():
+        print('design_sweep shared=%s %8.3f s' % (shared, t))
+    for pb, name, n, root_finds, error in bench_adaptive_sampling():
+        print('pb=%-10.6g %-8s %6d stations %6d root finds error %.2g' %
+              (pb, name, n, root_finds, error))
+    for wc, method, its, t in bench_continuation():
+        print('wc %d %-12s %6.1f iterations per station %8.3f s' %
+              (wc, method, its, t))
+    for name, t in bench_instrument_overhead():
+        print('x2m instrumentation %-4s %8.3f s' % (name, t))
+    print_rows(bench_batched_gas())
+    print('change_back_pressure + profile %8.4f s, rebuilt %8.4f s' %
+          bench_operating_change())
+    print('back_pressure_ramp %d samples %d events %8.3f s' %
+          bench_back_pressure_ramp())
+    rows, error = bench_pb_for_shock_at()
+    for name, t in rows:
+        print('%-22s %12.4g s per station' % (name, t))
+    print('pb_for_shock_at against bisection: max relative error %.2g' %
+          error)
+    sizes, timing = bench_config_memory()
+    for name, size in sizes:
+        print('%-22s %8.0f bytes per design' % (name, size))
+    print_rows([timing])
+    for single_pass, root_finds, t in report_root_finds():
+        print('generate(single_pass=%s) %8d root finds %8.3f s' %
+              (single_pass, root_finds, t))
+
+
+def print_rows(rows):
+    print('%-22s %10s %12s %12s %10s' %
+          ('function', 'points', 'loop [s]', 'array [s]', 'speedup'))
+    for name, n, t_loop, t_vec in rows:
+        print('%-22s %10d %12.4g %12.4g %10.1f' %
+              (name, n, t_loop, t_vec, t_loop/t_vec))
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description='Run the benchmark suite.')
+    parser.add_argument('-o', '--output', help='save the results as JSON')
+    parser.add_argument('-b', '--baseline', help='JSON results to compare')
+    parser.add_argument('-t', '--threshold', type=float, default=THRESHOLD,
+                        help='slowdown flagged as a regression, '
+                             'default %(default)s')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-k', '--filter', help='only cases containing this')
+    parser.add_argument('--extended', action='store_true',
+                        help='print the extended comparison tables instead')
+    args = parser.parse_args()
+
+    if args.extended:
+        print_extended()
+        sys.exit()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    results = run_suite(args.repeat, args.filter)
+    print_suite(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': metadata(), 'results': results}, f, indent=2,
+                      sort_keys=True)
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for name, t_base, t, ratio in regressions:
+            print('REGRESSION %-36s %12.4g -> %12.4g (%.2fx)' %
+                  (name, t_base, t, ratio))
+        sys.exit(1 if regressions else 0)
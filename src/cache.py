@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+import numpy as np
+
+from common import FlowProfile
+
+
+# A cache is a directory holding index.sqlite and one subdirectory per entry
+# with the flow table as table.npz and the plots as <plot type>.png. Entries
+# are keyed by a hash of every constructor parameter of the combination, the
+# gas constants, the number of stations and the sampling tolerance, so a
+# changed tunnel never hits a stale entry. Bump VERSION when the contents of
+# an entry change.
+VERSION = 1
+INDEX = 'index.sqlite'
+TABLE = 'table.npz'
+MAX_BYTES = 256 * 2**20
+
+DEFAULT_DIR = os.path.join(
+    os.environ.get('AERODYNAMICS_CACHE',
+                   os.path.join(os.path.expanduser('~'), '.cache',
+                                'aerodynamics')),
+    'reports')
+
+
+def _canonical(value):
+    # Numbers are stored as floats so that 6, 6. and np.int64(6) hash alike.
+    if isinstance(value, dict):
+        return dict((k, _canonical(v)) for k, v in value.items())
+    if value is None:
+        return None
+    return float(value)
+
+
+def report_key(model, steps, tol=None):
+    description = {'version': VERSION,
+                   'model': _canonical(model.parameters),
+                   'gas': _canonical(model.gas.parameters),
+                   'steps': int(steps),
+                   'tol': _canonical(tol)}
+    text = json.dumps(description, sort_keys=True)
+    return hashlib.sha256(text.encode('ascii')).hexdigest()
+
+
+def _size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name))
+               for name in os.listdir(directory))
+
+
+class ReportCache(object):
+
+    def __init__(self, directory=DEFAULT_DIR, max_bytes=MAX_BYTES):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._directory = directory
+        self._max_bytes = max_bytes
+        with self._connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS entries '
+                       '(key TEXT PRIMARY KEY, size INTEGER, '
+                       'created REAL, accessed REAL)')
+            db.execute('CREATE TABLE IF NOT EXISTS counters '
+                       '(name TEXT PRIMARY KEY, value INTEGER)')
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def _connect(self):
+        return sqlite3.connect(os.path.join(self._directory, INDEX),
+                               timeout=30)
+
+    def _path(self, key):
+        return os.path.join(self._directory, key)
+
+    def _count(self, db, name):
+        db.execute('INSERT OR IGNORE INTO counters VALUES (?, 0)', (name,))
+        db.execute('UPDATE counters SET value = value + 1 WHERE name = ?',
+                   (name,))
+
+    def key(self, model, steps, tol=None):
+        return report_key(model, steps, tol)
+
+    def get(self, key):
+        """Return the flow table and a dict of plot type to PNG filename,
+        or None on a miss."""
+        path = self._path(key)
+        with self._connect() as db:
+            found = db.execute('SELECT 1 FROM entries WHERE key = ?',
+                               (key,)).fetchone()
+            if found is None or not os.path.isdir(path):
+                self._count(db, 'misses')
+                return None
+            self._count(db, 'hits')
+            db.execute('UPDATE entries SET accessed = ? WHERE key = ?',
+                       (time.time(), key))
+
+        with np.load(os.path.join(path, TABLE)) as data:
+            table = FlowProfile(*[data[name] for name in FlowProfile._fields])
+        plots = dict((name[:-len('.png')], os.path.join(path, name))
+                     for name in os.listdir(path) if name.endswith('.png'))
+        return table, plots
+
+    def put(self, key, table, plots):
+        """Store the flow table and the PNG files of plots, a dict of plot
+        type to filename, then evict the least recently used entries until
+        the cache fits in max_bytes."""
+        path = self._path(key)
+        tmp = '%s.tmp-%d' % (path, os.getpid())
+        if os.path.isdir(tmp):
+            shutil.rmtree(tmp)
+        os.makedirs(tmp)
+        np.savez(os.path.join(tmp, TABLE), **table._asdict())
+        for plot_type, filename in plots.items():
+            shutil.copyfile(filename, os.path.join(tmp, '%s.png' % plot_type))
+        size = _size(tmp)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.rename(tmp, path)
+
+        now = time.time()
+        with self._connect() as db:
+            db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                       (key, size, now, now))
+        self.evict()
+
+    def evict(self, max_bytes=None):
+        max_bytes = self._max_bytes if max_bytes is None else max_bytes
+        with self._connect() as db:
+            rows = db.execute('SELECT key, size FROM entries '
+                              'ORDER BY accessed DESC').fetchall()
+            total = 0
+            for key, size in rows:
+                total += size
+                if total > max_bytes:
+                    db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                    shutil.rmtree(self._path(key), ignore_errors=True)
+                    self._count(db, 'evictions')
+
+    def stats(self):
+        with self._connect() as db:
+            entries, size = db.execute('SELECT COUNT(*), SUM(size) '
+                                       'FROM entries').fetchone()
+            counters = dict(db.execute('SELECT name, value FROM counters'))
+        return {'directory': self._directory,
+                'entries': entries,
+                'bytes': size or 0,
+                'max_bytes': self._max_bytes,
+                'hits': counters.get('hits', 0),
+                'misses': counters.get('misses', 0),
+                'evictions': counters.get('evictions', 0)}
+
+    def clear(self):
+        with self._connect() as db:
+            for key, in db.execute('SELECT key FROM entries').fetchall():
+                shutil.rmtree(self._path(key), ignore_errors=True)
+            db.execute('DELETE FROM entries')
+            db.execute('DELETE FROM counters')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the report cache.')
+    parser.add_argument('command', choices=['stats', 'clear', 'evict'])
+    parser.add_argument('--directory', default=DEFAULT_DIR)
+    parser.add_argument('--max-bytes', type=int, default=MAX_BYTES)
+    args = parser.parse_args()
+
+    cache = ReportCache(args.directory, args.max_bytes)
+    if args.command == 'clear':
+        cache.clear()
+    elif args.command == 'evict':
+        cache.evict()
+    for name, value in sorted(cache.stats().items()):
+        print('%-10s %s' % (name, value))
@@ -5,33 +5,109 @@ from __future__ import absolute_import, division
 
 import numpy as np
 
-import matplotlib
-matplotlib.use('Agg')
-from matplotlib import pyplot as plt
-
-from common import Model, View, Controller
-from wind_tunnel import WindTunnel
+from common import Model, FlowProfile, InvalidCall
+from instrument import instrumented
 from test_section import TestSection
 from diffuser import Diffuser
 
 
+# Report and WindTunnelReportCreator moved to report, the only module that
+# loads matplotlib. They are still importable from here, and only then is
+# report imported.
+_REPORT_NAMES = ('Report', 'WindTunnelReportCreator')
+
+
+def __getattr__(name):
+    if name in _REPORT_NAMES:
+        import report
+        return getattr(report, name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
 class InvalidThroatArea(Exception):
     pass
 
 
+class InvalidWorkingCondition(InvalidCall):
+    pass
+
+
+# Working conditions of the nozzle a diffuser can follow.
+DIFFUSER_WCS = (1, 2, 6)
+
+
+def check_diffuser_wc(wc):
+    if wc not in DIFFUSER_WCS:
+        raise InvalidWorkingCondition(
+            'No diffuser behind a nozzle in working condition %d' % wc)
+
+
 class Combination(Model):
 
+    # The test section and the diffuser are fed the exit state of the
+    # nozzle. When pb, p01 or t0 of the nozzle change they are updated the
+    # next time they are used, and only their pressure dependent values are
+    # recomputed. A nozzle out of DIFFUSER_WCS leaves the diffuser stale,
+    # and it raises InvalidWorkingCondition only when it is evaluated.
+
     def __init__(self, nozzle):
         self._nozzle = nozzle
         self._ts = None
         self._diffuser = None
+        self._bounds = None
+        self._synced = nozzle.version
+        self._stale = False
+
+    def _exit_state(self):
+        # Mach number, p, T and total pressure at the nozzle exit.
+        nozzle = self._nozzle
+        p02 = nozzle.p02
+        return (nozzle.x2m(self.n_len),
+                nozzle.x2p(self.n_len)*p02,
+                nozzle.x2t(self.n_len)*nozzle.t0,
+                p02)
+
+    def _sync(self):
+        nozzle = self._nozzle
+        if self._synced == nozzle.version:
+            return
+        m, p, t, p02 = self._exit_state()
+        stale = nozzle.wc not in DIFFUSER_WCS
+        if self._ts is not None:
+            self._ts.change_inlet(m, p, t, p02, nozzle.t0)
+        if self._diffuser is not None and not stale:
+            self._diffuser.change_inlet(m, p02, p, t, nozzle.p01, nozzle.wc)
+        self._stale = stale
+        self._synced = nozzle.version
+
+    def _component(self, i):
+        # Component i fed the current exit state of the nozzle.
+        self._sync()
+        if i == 2 and self._diffuser is not None and self._stale:
+            check_diffuser_wc(self._nozzle.wc)
+        return (self._nozzle, self._ts, self._diffuser)[i]
+
+    def change_back_pressure(self, p):
+        # The nozzle and the diffuser discharge against the same pb.
+        self._nozzle.change_back_pressure(p)
+        if self._diffuser is not None:
+            self._diffuser.change_back_pressure(p)
+
+    def change_p01(self, p0):
+        self._nozzle.change_p01(p0)
+
+    def change_t0(self, t0):
+        self._nozzle.change_t0(t0)
 
     def add_test_section(self, ts_len):
-        self._ts = TestSection(self._nozzle.x2m(self.n_len),
+        self._sync()
+        self._bounds = None
+        m, p, t, p02 = self._exit_state()
+        self._ts = TestSection(m,
                                self._nozzle.ats,
-                               self._nozzle.x2p(self.n_len)*self._nozzle.p02,
-                               self._nozzle.x2t(self.n_len)*self._nozzle.t0,
-                               self._nozzle.p02,
+                               p,
+                               t,
+                               p02,
                                self._nozzle.t0,
                                self._nozzle.z_len,
                                ts_len)
@@ -44,10 +120,14 @@ class Combination(Model):
                      back_pressure):
         if not self._nozzle.at <= at < self._nozzle.ats:
             raise InvalidThroatArea
-        self._diffuser = Diffuser(self._nozzle.x2m(self.n_len),
-                                  self._nozzle.p02,
-                                  self._nozzle.x2p(self.n_len)*self._nozzle.p02,
-                                  self._nozzle.x2t(self.n_len)*self._nozzle.t0,
+        check_diffuser_wc(self._nozzle.wc)
+        self._sync()
+        self._bounds = None
+        m, p, t, p02 = self._exit_state()
+        self._diffuser = Diffuser(m,
+                                  p02,
+                                  p,
+                                  t,
                                   self._nozzle.ats,
                                   at,
                                   ae,
@@ -57,7 +137,9 @@ class Combination(Model):
                                   back_pressure,
                                   self._nozzle.at,
                                   self._nozzle.p01,
-                                  self._nozzle.wc)
+                                  self._nozzle.wc,
+                                  self._nozzle.gas)
+        self._stale = False
 
     @property
     def n_len(self):
@@ -87,16 +169,80 @@ class Combination(Model):
     def t_len(self):
         return self.n_ts_d_len
 
+    @property
+    def gas(self):
+        return self._nozzle.gas
+
+    @property
+    def parameters(self):
+        nozzle, ts, diffuser = self.components
+        return {'nozzle': nozzle.parameters,
+                'test_section': ts and ts.parameters,
+                'diffuser': diffuser and diffuser.parameters}
+
+    @property
+    def components(self):
+        return tuple(self._component(i) for i in range(3))
+
+    @property
+    def bounds(self):
+        # Upper ends of the nozzle, the test section and the diffuser.
+        if self._bounds is None:
+            self._bounds = np.array([self.n_len,
+                                     self.n_ts_len,
+                                     self.n_ts_d_len])
+        return self._bounds
+
+    @property
+    def breakpoints(self):
+        offsets = np.concatenate([[0], self.bounds[:-1]])
+        return np.unique(np.concatenate(
+            [component.breakpoints+offset
+             for component, offset in zip(self.components, offsets)]))
+
+    def x2segment(self, x):
+        # Index of the component x falls in, -1 outside of the combination.
+        seg = np.searchsorted(self.bounds, x, side='left')
+        return np.where((x < 0) | (seg == len(self.bounds)), -1, seg)
+
     def x2func(self, func, x):
+        if np.ndim(x):
+            x = np.asarray(x, float)
+            seg = self.x2segment(x)
+            res = np.zeros(x.shape)
+            offsets = np.concatenate([[0], self.bounds[:-1]])
+            for i in range(len(offsets)):
+                mask = seg == i
+                if mask.any():
+                    res[mask] = getattr(self._component(i), func)(
+                        x[mask]-offsets[i])
+            return res
+
         res = 0
         if 0 <= x <= self.n_len:
-            res = getattr(self._nozzle, func)(x)
+            res = getattr(self._component(0), func)(x)
         elif self.n_len < x <= self.n_ts_len:
-            res = getattr(self._ts, func)(x-self.n_len)
+            res = getattr(self._component(1), func)(x-self.n_len)
         elif self.n_ts_len < x <= self.n_ts_d_len:
-            res = getattr(self._diffuser, func)(x-self.n_ts_len)
+            res = getattr(self._component(2), func)(x-self.n_ts_len)
         return res
 
+    @instrumented('Combination.profile')
+    def profile(self, xs, method=None):
+        x = np.asarray(xs, float)
+        seg = self.x2segment(x)
+        columns = [np.zeros(x.shape) for _ in FlowProfile._fields[1:]]
+        offsets = np.concatenate([[0], self.bounds[:-1]])
+        for i in range(len(offsets)):
+            mask = seg == i
+            if mask.any():
+                profile = self._component(i).profile(x[mask]-offsets[i],
+                                                     method)
+                for column, values in zip(columns, profile[1:]):
+                    column[mask] = values
+        return FlowProfile(x, *columns)
+
+    @instrumented('Combination.x2m')
     def x2m(self, x):
         return self.x2func('x2m', x)
 
@@ -106,12 +252,15 @@ class Combination(Model):
     def x2y(self, x):
         return self.x2func('x2y', x)
 
+    @instrumented('Combination.x2p')
     def x2p(self, x):
         return self.x2func('x2p', x)
 
+    @instrumented('Combination.x2t')
     def x2t(self, x):
         return self.x2func('x2t', x)
 
+    @instrumented('Combination.x2rho')
     def x2rho(self, x):
         return self.x2func('x2rho', x)
 
@@ -124,109 +273,15 @@ class Combination(Model):
         xs = np.zeros(2*n)
         ys = np.zeros(2*n)
 
-        for i in xrange(n):
+        for i in range(n):
             xs[i] = x1[i]
             xs[i+n] = x2[i]
-        for i in xrange(n):
+        for i in range(n):
             ys[i] = self.x2y(xs[i])
             ys[2*n-i-1] = -self.x2y(xs[i])
         return np.array([xs, ys]).T
 
 
-class Report(View):
-
-    def __init__(self):
-        pass
-
-    def wall_shape(self, points):
-        n = len(points)
-        points = np.vstack([points, points[0]])
-        fig = plt.figure()
-
-        for i in xrange(n):
-            sub = fig.add_subplot(111)
-            x = [points[i, 0], points[i+1, 0]]
-            y = [points[i, 1], points[i+1, 1]]
-            sub.plot(x, y, 'b')
-
-        #t_len = self.wt.t_len
-        #max_y = self.wt.ymax
-
-        #h_margin = t_len * 0.1 / 2
-        #v_margin = max_y * 0.1
-        #plt.axis([-h_margin, t_len+h_margin,
-        #          -max_y-v_margin, max_y+v_margin])
-        return fig
-
-    def graph(self, x, profile):
-        graph = plt.figure()
-        sub = graph.add_subplot(111)
-        sub.plot(x, profile, 'b')
-        return graph
-
-
-class WindTunnelReportCreator(Controller):
-
-    def __init__(self, model, view):
-        Controller.__init__(self, model, view)
-
-    @property
-    def plot_types(self):
-        return ['s', 'a', 'm', 'p', 'rho', 't']
-
-    def save_plot(self, filename, plot_type, steps=1000):
-        if plot_type == 's':
-            points = self._model.get_wall_shape()
-            fig = self._view.wall_shape(points)
-            fig.savefig(filename)
-        else:
-            xs = np.linspace(0, self._model.t_len, steps)
-            profile = np.zeros(steps)
-
-            if plot_type == 'a':
-                for i in xrange(steps):
-                    profile[i] = self._model.x2a(xs[i])
-            elif plot_type == 'm':
-                for i in xrange(steps):
-                    profile[i] = self._model.x2m(xs[i])
-            elif plot_type == 'p':
-                for i in xrange(steps):
-                    profile[i] = self._model.x2p(xs[i])
-            elif plot_type == 'rho':
-                for i in xrange(steps):
-                    profile[i] = self._model.x2rho(xs[i])
-            elif plot_type == 't':
-                for i in xrange(steps):
-                    profile[i] = self._model.x2t(xs[i])
-
-            graph = self._view.graph(xs, profile)
-            graph.savefig(filename)
-
-    def generate(self):
-        for t in self.plot_types:
-            self.save_plot('%s.png' % t, t)
-
-
 if __name__ == '__main__':
-    import uuid
-    #pb = .068399E6
-    pb = 0.99E6
-    t = WindTunnel(2.4,               # md
-                   0.24,              # ats
-                   1e6,               # p0
-                   300,               # t0
-                   20,                # ain
-                   5,                 # con_len
-                   5,                 # div_len
-                   1,                 # z_len
-                   0.99E6)            # pb
-    com = Combination(t)
-    com.add_test_section(5)           # ts_len
-    com.add_diffuser(0.17,            # at
-                     5,               # ae
-                     5,               # con_len
-                     5,               # div_len
-                     0.99E6)          # pb
-    r = Report()
-    c = WindTunnelReportCreator(com, r)
-    c.generate()
+    import report
+    report.demo()
@@ -3,19 +3,85 @@
 
 from __future__ import absolute_import, division
 
-from constants import GAMMA
+from collections import Counter, namedtuple
+
+import numpy as np
+
+from constants import EPSILON
+from gas import AIR
 
 
 # Range used in scipy.optimize.brentq
 MIN_MACH, MAX_MACH = 1E-5, 100.
 
 
+# Flow quantities along a duct: area, half height, Mach number, and p, T and
+# rho over their upstream stagnation values.
+FlowProfile = namedtuple('FlowProfile', 'x a y m p t rho')
+
+
 class InvalidCall(Exception):
     pass
 
 
 class Model(object):
-    pass
+
+    # Names of the constructor arguments, each kept as _<name>.
+    PARAMETERS = ()
+
+    @property
+    def parameters(self):
+        return dict((name, getattr(self, '_' + name))
+                    for name in self.PARAMETERS)
+
+    # Values of the properties decorated with cached() are kept per group
+    # until the group is invalidated.
+
+    def _cached(self, group, name, func):
+        if '_cache' not in self.__dict__:
+            self._cache = {}
+            self._cache_stats = Counter()
+        key = (group, name)
+        if key in self._cache:
+            self._cache_stats['hits'] += 1
+            return self._cache[key]
+        self._cache_stats['misses'] += 1
+        value = self._cache[key] = func(self)
+        return value
+
+    def invalidate(self, *groups):
+        cache = self.__dict__.get('_cache', {})
+        for key in [k for k in cache if k[0] in groups]:
+            del cache[key]
+
+    # The version counts the changes of the inputs of a model, so that the
+    # models fed from it can tell that they are stale.
+
+    _version = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def changed(self, *groups):
+        self.invalidate(*groups)
+        self._version += 1
+
+    def cache_info(self):
+        stats = self.__dict__.get('_cache_stats', Counter())
+        return {'hits': stats['hits'],
+                'misses': stats['misses'],
+                'size': len(self.__dict__.get('_cache', {}))}
+
+
+def cached(group):
+    def decorator(func):
+        name = func.__name__
+
+        def getter(self):
+            return self._cached(group, name, func)
+        return property(getter, doc=func.__doc__)
+    return decorator
 
 
 class View(object):
@@ -29,5 +95,28 @@ class Controller(object):
         self._view = view
 
 
-def func1(m):
-    return 1 + (GAMMA-1) / 2 * m ** 2
\ No newline at end of file
+def classify(ratio, pl, pns, pd):
+    # Working condition for pb/p01 given the three threshold pressure
+    # ratios: the limiting case, the normal shock at the exit and the design
+    # case. The bands are checked in order, as in an if/elif chain.
+    ratio = np.asarray(ratio, float)
+    wc = np.select([ratio > pl,
+                    abs(ratio-pl) < EPSILON,
+                    (pns < ratio) & (ratio < pl),
+                    abs(ratio-pns) < EPSILON,
+                    (pd < ratio) & (ratio < pns),
+                    abs(ratio-pd) < EPSILON,
+                    ratio < pd],
+                   [1, 2, 3, 4, 5, 6, 7])
+    if wc.ndim == 0:
+        return int(wc)
+    return wc
+
+
+def func1(m, gas=AIR):
+    return 1 + gas.half_gm1 * m ** 2
+
+
+def func12m(f, gas=AIR):
+    with np.errstate(invalid='ignore'):
+        return np.sqrt((f-1)*gas.two_gm1)
\ No newline at end of file
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+
+from __future__ import absolute_import, division
+
+from collections import namedtuple
+
+import numpy as np
+
+import isentropic_flow as ise_flow
+import normal_shock_wave as nsw
+from common import classify
+from gas import AIR, GasModel
+from wind_tunnel import WindTunnel
+from test_section import TestSection
+from diffuser import Diffuser
+
+
+# Frozen records of the constructor arguments of a model. They are
+# namedtuples, so they have no __dict__, cannot be changed, and compare and
+# hash by value: a record can key a memo of results, and equal designs share
+# one entry. build() makes the model.
+#
+# Many designs of one kind can also be held as a structured array with one
+# field per parameter, and the gas as gamma, r and cp, see to_records().
+
+# Struct-of-arrays form of the working condition of many nozzles: the
+# throat area, the thresholds of classify() and the working condition.
+NozzleConditions = namedtuple('NozzleConditions', 'at pl pns pd wc')
+
+GAS_FIELDS = ('gamma', 'r', 'cp')
+
+
+class _Config(object):
+
+    __slots__ = ()
+
+    MODEL = None
+
+    @classmethod
+    def from_model(cls, model):
+        values = model.parameters
+        if 'gas' in cls._fields:
+            values['gas'] = model.gas
+        return cls(**values)
+
+    def build(self):
+        return self.MODEL(*self)
+
+    @classmethod
+    def dtype(cls):
+        names = [name for name in cls._fields if name != 'gas']
+        if 'gas' in cls._fields:
+            names.extend(GAS_FIELDS)
+        return np.dtype([(name, float) for name in names])
+
+    @classmethod
+    def to_records(cls, configs):
+        """Structured array of configs, one record per config."""
+        records = np.empty(len(configs), cls.dtype())
+        for name in cls._fields:
+            if name == 'gas':
+                for field in GAS_FIELDS:
+                    records[field] = [getattr(c.gas, field) for c in configs]
+            else:
+                records[name] = [getattr(c, name) for c in configs]
+        return records
+
+    @classmethod
+    def from_records(cls, records):
+        configs = []
+        for record in records.tolist():
+            values = dict(zip(records.dtype.names, record))
+            if 'gas' in cls._fields:
+                values['gas'] = _gas(*[values.pop(f) for f in GAS_FIELDS])
+            configs.append(cls(**values))
+        return configs
+
+
+def _gas(gamma, r, cp):
+    # Records of air rebuild the shared AIR, so they compare equal to it
+    # without computing its coefficients again.
+    if (gamma, r, cp) == (AIR.gamma, AIR.r, AIR.cp):
+        return AIR
+    return GasModel(gamma, r, cp)
+
+
+class WindTunnelConfig(_Config, namedtuple('WindTunnelConfig',
+                                           WindTunnel.PARAMETERS + ('gas',))):
+
+    __slots__ = ()
+
+    MODEL = WindTunnel
+
+
+class TestSectionConfig(_Config, namedtuple('TestSectionConfig',
+                                            TestSection.PARAMETERS)):
+
+    __slots__ = ()
+
+    MODEL = TestSection
+
+
+class DiffuserConfig(_Config, namedtuple('DiffuserConfig',
+                                         Diffuser.PARAMETERS + ('gas',))):
+
+    __slots__ = ()
+
+    MODEL = Diffuser
+
+
+WindTunnelConfig.__new__.__defaults__ = (AIR,)
+DiffuserConfig.__new__.__defaults__ = (AIR,)
+
+
+def nozzle_conditions(records):
+    """Working condition of every nozzle in a structured array of
+    WindTunnelConfig records, computed for all of them at once."""
+    gas = GasModel(records['gamma'], records['r'], records['cp'])
+    md = records['design_mach']
+    atsat = ise_flow.m2a(md, gas)
+    ml = ise_flow.a2m(atsat, 0, gas=gas)
+    pl = ise_flow.m2p(ml, gas)
+    pd = ise_flow.m2p(md, gas)
+    pns = pd * nsw.m2p(md, gas)
+    wc = classify(records['back_pressure']/records['p01'], pl, pns, pd)
+    return NozzleConditions(records['test_section_area']/atsat, pl, pns, pd,
+                            wc)
@@ -3,17 +3,29 @@
 
 from __future__ import absolute_import, division
 
+from collections import namedtuple
+
 import numpy as np
-from scipy.optimize import brentq
 
-from constants import EPSILON
 import isentropic_flow as ise_flow
 import normal_shock_wave as nsw
-from common import Model
+from instrument import instrumented
+from common import Model, FlowProfile, cached, classify
+from gas import AIR
+
+
+# Normal shock in the diffuser: exit A/A*.p/p0, exit Mach number, total
+# pressure behind the shock and its ratio to p01, throat area behind the
+# shock, Mach number in front of the shock and shock location.
+ShockSolution = namedtuple('ShockSolution', 'ap me p02 p02p01 a2star m1 xns')
 
 
 class Diffuser(Model):
 
+    PARAMETERS = ('in_mach', 'p01', 'in_p', 'in_t', 'in_area', 'at', 'ae',
+                  'con_len', 'div_len', 'z_len', 'back_pressure', 'nat', 'np0',
+                  'nwc')
+
     def __init__(self,
                  in_mach,
                  p01,
@@ -28,7 +40,8 @@ class Diffuser(Model):
                  back_pressure,
                  nat,
                  np0,
-                 nwc):
+                 nwc,
+                 gas=AIR):
         self._in_mach = in_mach
         self._p01 = p01
         self._in_p = in_p
@@ -42,10 +55,33 @@ class Diffuser(Model):
         self._back_pressure = back_pressure
         self._nat = nat
         self._np0 = np0
+        self._gas = gas
 
         assert nwc in (1, 2, 6)
         self._nwc = nwc
 
+    ##########################################################################
+    # The shock solution depends on the inlet state and pb, thresholds only
+    # on the geometry.
+
+    def change_inlet(self, in_mach, p01, in_p, in_t, np0, nwc):
+        assert nwc in (1, 2, 6)
+        self._in_mach = in_mach
+        self._p01 = p01
+        self._in_p = in_p
+        self._in_t = in_t
+        self._np0 = np0
+        self._nwc = nwc
+        self.changed('shock')
+
+    def change_back_pressure(self, p):
+        self._back_pressure = p
+        self.changed('shock')
+
+    @property
+    def gas(self):
+        return self._gas
+
     @property
     def in_mach(self):
         return self._in_mach
@@ -137,6 +173,17 @@ class Diffuser(Model):
     #    return self.a2x(area, 0)
 
     def x2a(self, x):
+        if np.ndim(x):
+            x = np.asarray(x, float)
+            con = (0 <= x) & (x <= self.con_len)
+            div = (self.con_len < x) & (x <= self.t_len)
+            xc, xd = x[con], x[div]
+            area = np.zeros(x.shape)
+            area[con] = (self.ain*self.con_len-self.ain*xc+self.at*xc) / \
+                self.con_len
+            area[div] = (self.ae-self.at)*(xd-self.con_len)/self.div_len + \
+                self.at
+            return area
         area = 0
         if 0 <= x <= self.con_len:
             area = (self.ain*self.con_len-self.ain*x+self.at*x) / self.con_len
@@ -147,99 +194,150 @@ class Diffuser(Model):
     def x2y(self, x):
         return self.x2a(x) / self.z_len / 2
 
+    @instrumented('Diffuser.a2x')
     def a2x(self, a, front=1):
+        # The walls are straight, so x2a inverts in closed form.
+        a = np.asarray(a, float)
         if front:
-            return brentq(lambda x: self.x2a(x)-a, 0, self.con_len)
+            x = (self.ain-a) * self.con_len / (self.ain-self.at)
         else:
-            return brentq(lambda x: self.x2a(x)-a, self.con_len, self.t_len)
+            x = (a-self.at)*self.div_len/(self.ae-self.at) + self.con_len
+        return x[()]
 
-    def get_working_condition(self):
+    @cached('geometry')
+    def thresholds(self):
         # Mach number for the limiting case.
-        ml = ise_flow.a2m(self.ae/self.at, 0)
+        ml = ise_flow.a2m(self.ae/self.at, 0, gas=self.gas)
         # Mach number for the design case.
-        mmax = ise_flow.a2m(self.ae/self.at, 1)
+        mmax = ise_flow.a2m(self.ae/self.at, 1, gas=self.gas)
 
-        pl = ise_flow.m2p(ml)
-        pd = ise_flow.m2p(mmax)
-        pns = ise_flow.m2p(mmax) * nsw.m2p(mmax)
+        pl = ise_flow.m2p(ml, gas=self.gas)
+        pd = ise_flow.m2p(mmax, gas=self.gas)
+        pns = ise_flow.m2p(mmax, gas=self.gas) * nsw.m2p(mmax, gas=self.gas)
+        return pl, pns, pd
 
-        ratio = self.pb / self.p01
-        if ratio > pl:
-            wc = 1
-        elif abs(ratio-pl) < EPSILON:
-            wc = 2
-        elif pns < ratio < pl:
-            wc = 3
-        elif abs(ratio-pns) < EPSILON:
-            wc = 4
-        elif pd < ratio < pns:
-            wc = 5
-        elif abs(ratio-pd) < EPSILON:
-            wc = 6
-        elif ratio < pd:
-            wc = 7
-        return wc
+    def classify(self, pb_over_p01):
+        return classify(pb_over_p01, *self.thresholds)
+
+    def get_working_condition(self):
+        return self.classify(self.pb/self.p01)
+
+    @cached('shock')
+    def shock(self):
+        # The whole shock solution is computed once, and again after
+        # change_inlet or change_back_pressure.
+        ap = self.ae / self.nat * self.pb / self.np0
+        me = ise_flow.ap2m(ap, gas=self.gas)
+        p02 = self.pb / ise_flow.m2p(me, gas=self.gas)
+        p02p01 = p02 / self.p01
+        a2star = (ap/(self.pb/p02)/self.ae) ** -1
+        m1 = nsw.p02m(p02p01, gas=self.gas)
+        xns = self.a2x(ise_flow.m2a(m1, gas=self.gas)*self.nat, 0)
+        return ShockSolution(ap, me, p02, p02p01, a2star, m1, xns)
 
     @property
     def shock_ap(self):
-        return self.ae / self.nat * self.pb / self.np0
+        return self.shock.ap
 
     @property
     def shock_me(self):
-        return ise_flow.ap2m(self.shock_ap)
+        return self.shock.me
 
     @property
     def shock_p02(self):
-        return self.pb / ise_flow.m2p(self.shock_me)
+        return self.shock.p02
 
     @property
     def shock_p02p01(self):
-        return self.pb / ise_flow.m2p(self.shock_me) / self.p01
+        return self.shock.p02p01
 
     @property
     def shock_a2star(self):
-        return (self.shock_ap/(self.pb/self.shock_p02)/self.ae) ** -1
+        return self.shock.a2star
 
     @property
     def shock_m1(self):
-        return nsw.p02m(self.shock_p02p01)
+        return self.shock.m1
 
     @property
     def xns(self):
-        area = ise_flow.m2a(self.shock_m1) * self.nat
-        return self.a2x(area, 0)
+        return self.shock.xns
+
+    @property
+    def breakpoints(self):
+        xs = [0, self.con_len, self.t_len]
+        if self.nwc == 6:
+            xs.append(self.xns)
+        return np.unique(xs)
 
     def get_astar_if_subsonic(self):
-        return self.ae / ise_flow.m2a(ise_flow.p2m(self.pb/self.p01))
+        return self.ae / ise_flow.m2a(
+            ise_flow.p2m(self.pb/self.p01, gas=self.gas), gas=self.gas)
 
+    @instrumented('Diffuser.x2m')
     def x2m(self, x):
+        if np.ndim(x):
+            return self.profile(x).m
         m = 0
         if self.nwc in (1, 2):
             aastar = self.x2a(x) / self.get_astar_if_subsonic()
-            m = ise_flow.a2m(aastar, 0)
+            m = ise_flow.a2m(aastar, 0, gas=self.gas)
         elif self.nwc == 6:
             if 0 <= x <= self.xns:
-                m = ise_flow.a2m(self.x2a(x)/self.nat, 1)
+                m = ise_flow.a2m(self.x2a(x)/self.nat, 1, gas=self.gas)
             elif self.xns < x <= self.t_len:
-                m = ise_flow.a2m(self.x2a(x)/self.nat, supersonic=0)
+                m = ise_flow.a2m(self.x2a(x)/self.nat, supersonic=0,
+                                 gas=self.gas)
         return m
 
+    @instrumented('Diffuser.x2p')
     def x2p(self, x):
+        if np.ndim(x):
+            return self.profile(x).p
         p = 0
         if self.nwc in (1, 2):
-            p = ise_flow.m2p(self.x2m(x))
+            p = ise_flow.m2p(self.x2m(x), gas=self.gas)
         elif self.nwc == 6:
             if 0 <= x <= self.xns:
-                p = ise_flow.m2p(self.x2m(x))
+                p = ise_flow.m2p(self.x2m(x), gas=self.gas)
             elif self.xns < x <= self.t_len:
-                p = ise_flow.m2p(self.x2m(x)) * self.shock_p02p01
+                p = ise_flow.m2p(self.x2m(x), gas=self.gas) * self.shock_p02p01
         return p
 
+    @instrumented('Diffuser.x2rho')
     def x2rho(self, x):
-        return self.x2p(x) / (self.x2t(x)) ** -1
+        if np.ndim(x):
+            return self.profile(x).rho
+        return self.x2p(x) / self.x2t(x)
 
+    @instrumented('Diffuser.x2t')
     def x2t(self, x):
-        return ise_flow.m2t(self.x2m(x))
+        if np.ndim(x):
+            return self.profile(x).t
+        return ise_flow.m2t(self.x2m(x), gas=self.gas)
+
+    @instrumented('Diffuser.profile')
+    def profile(self, xs, method=None):
+        x = np.asarray(xs, float)
+        a = self.x2a(x)
+        m = np.zeros(x.shape)
+        p02p01 = np.ones(x.shape)
+
+        inside = (0 <= x) & (x <= self.t_len)
+        if self.nwc in (1, 2):
+            astar = self.get_astar_if_subsonic()
+            m[inside] = ise_flow.a2m(a[inside]/astar, 0, method, gas=self.gas)
+        elif self.nwc == 6:
+            shock = self.shock
+            sup = inside & (x <= shock.xns)
+            sub = inside & (x > shock.xns)
+            m[sup] = ise_flow.a2m(a[sup]/self.nat, 1, method, gas=self.gas)
+            m[sub] = ise_flow.a2m(a[sub]/self.nat, 0, method, gas=self.gas)
+            p02p01[sub] = shock.p02p01
+
+        p = np.where(inside, ise_flow.m2p(m, gas=self.gas)*p02p01, 0)
+        t = ise_flow.m2t(m, gas=self.gas)
+        return FlowProfile(x, a, a/self.z_len/2, m, p, t, p/t)
 
     def get_astar_if_subsonic(self):
-        return self.ain / ise_flow.m2a(self.in_mach)
+        return self.ain / ise_flow.m2a(self.in_mach, gas=self.gas)
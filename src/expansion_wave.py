@@ -3,17 +3,16 @@
 
 from __future__ import absolute_import, division
 
-from math import atan, pi, sqrt
+import numpy as np
 
-from constants import GAMMA
+from gas import AIR
 
 
-def nu_in_rad(m):
-    a = (GAMMA+1) / (GAMMA-1)
-    b = sqrt(a**(-1)*(m**2-1))
-    c = sqrt(m**2-1)
-    return sqrt(a) * atan(b) - atan(c)
+def nu_in_rad(m, gas=AIR):
+    a = gas.sqrt_gp1_gm1
+    c = np.sqrt(m**2-1)
+    return a * np.arctan(c/a) - np.arctan(c)
 
 
-def nu_in_deg(m):
-    return nu_in_rad(m) * 180 / pi
+def nu_in_deg(m, gas=AIR):
+    return nu_in_rad(m, gas) * 180 / np.pi
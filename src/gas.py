@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+
+from __future__ import absolute_import, division
+
+import numpy as np
+
+from constants import GAMMA, R
+from solvers import newton as _newton
+
+
+class GasModel(object):
+    """Calorically perfect gas with the gamma-dependent coefficients of the
+    relations computed once.
+
+    gamma, r and cp may be arrays to evaluate several gases at once. The
+    relations broadcast their arguments against them, e.g. m[:, None]
+    against gamma of shape (k,). cp defaults to gamma*r/(gamma-1).
+    """
+
+    def __init__(self, gamma=GAMMA, r=R, cp=None):
+        g = np.asarray(gamma, float)[()]
+        r = np.asarray(r, float)[()]
+        if cp is None:
+            cp = g * r / (g-1)
+        self.gamma, self.r, self.cp = g, r, np.asarray(cp, float)[()]
+        self.cv = self.cp - r
+        self.cp_r = self.cp / r
+
+        # func1 = 1 + half_gm1*m**2 and its inverse.
+        self.gm1 = g - 1
+        self.half_gm1 = (g-1) / 2
+        self.half_gp1 = (g+1) / 2
+        self.two_gm1 = 2 / (g-1)
+
+        # p/p0, rho/rho0 and A/A* as powers of func1, and back.
+        self.p_exp = -g / (g-1)
+        self.rho_exp = -1 / (g-1)
+        self.p_inv_exp = -(g-1) / g
+        self.rho_inv_exp = -(g-1)
+        self.two_gp1 = 2 / (g+1)
+        self.a_exp = (g+1) / (2*(g-1))
+        # A/A* tends to a_sup*m**(2/(gamma-1)) for m >> 1 and to a_sub/m
+        # for m << 1, used to seed a2m and to invert A/A*.p/p0.
+        self.a_sup = ((g-1)/(g+1)) ** self.a_exp
+        self.a_sub = self.two_gp1 ** self.a_exp
+
+        # Normal shock and Prandtl-Meyer function.
+        self.two_g_gp1 = 2 * g / (g+1)
+        self.sqrt_gp1_gm1 = np.sqrt((g+1)/(g-1))
+
+    @property
+    def batched(self):
+        return np.ndim(self.gamma) + np.ndim(self.r) + np.ndim(self.cp) > 0
+
+    @property
+    def parameters(self):
+        return {'gamma': self.gamma, 'r': self.r, 'cp': self.cp}
+
+    @property
+    def key(self):
+        return tuple(tuple(np.ravel(v).tolist())
+                     for v in (self.gamma, self.r, self.cp))
+
+    def __eq__(self, other):
+        return isinstance(other, GasModel) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return 'GasModel(gamma=%r, r=%r, cp=%r)' % (self.gamma, self.r,
+                                                   self.cp)
+
+
+# cp is derived like that of any other GasModel, so GasModel() and
+# GasModel(1.4, 287.) are AIR. It differs from constants.CP by rounding only.
+AIR = GasModel(GAMMA, R)
+
+
+def _from_coefficients(names, values):
+    gas = GasModel.__new__(GasModel)
+    gas.__dict__.update(zip(names, values))
+    return gas
+
+
+def single_gas(gas, method):
+    # The solvers that go point by point, and the tables, take one gas.
+    if gas.batched:
+        from common import InvalidCall
+        raise InvalidCall('Method %r needs a single gas' % method)
+    return gas
+
+
+def newton(log_forward, target, x0, lo, hi, gas):
+    """solvers.newton on log_forward(m, gas). The coefficients of a batched
+    gas are broadcast against target and sliced along with the elements
+    still iterating, so they are not computed again."""
+    if not gas.batched:
+        return _newton(lambda m: log_forward(m, gas), target, x0, lo, hi)
+    names = list(gas.__dict__)
+    return _newton(lambda m, *values: log_forward(
+                       m, _from_coefficients(names, values)),
+                   target, x0, lo, hi, args=[gas.__dict__[name]
+                                             for name in names])
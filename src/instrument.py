@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+
+from __future__ import absolute_import, division, print_function
+
+import functools
+import json
+import os
+import sys
+from collections import namedtuple
+from contextlib import contextmanager
+from timeit import default_timer
+
+
+# Functions decorated with instrumented(name) are recorded while an
+# instrument() block is active. Outside of one the wrapper only checks the
+# module global _session, so the disabled cost is a function call and a
+# comparison. Times, root finds and brentq iterations are inclusive: a2x
+# counts the a2m calls it makes.
+_session = None
+
+Stats = namedtuple('Stats', 'name calls points iterations time')
+
+
+class Session(object):
+
+    def __init__(self, trace=False):
+        import solvers
+        self._solvers = solvers
+        self._calls = {}
+        self._events = [] if trace else None
+        self._start = default_timer()
+
+    def _counts(self):
+        return (sum(self._solvers.counter.values()),
+                sum(self._solvers.iterations.values()))
+
+    def call(self, name, func, args, kwargs):
+        points, iterations = self._counts()
+        start = default_timer()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end = default_timer()
+            new_points, new_iterations = self._counts()
+            record = self._calls.setdefault(name, [0, 0, 0, 0.])
+            record[0] += 1
+            record[1] += new_points - points
+            record[2] += new_iterations - iterations
+            record[3] += end - start
+            if self._events is not None:
+                self._events.append({'name': name, 'ph': 'X',
+                                     'ts': (start-self._start)*1E6,
+                                     'dur': (end-start)*1E6,
+                                     'pid': os.getpid(), 'tid': 0})
+
+    @property
+    def stats(self):
+        # Sorted by total time, longest first.
+        stats = [Stats(name, *record) for name, record in self._calls.items()]
+        return sorted(stats, key=lambda s: -s.time)
+
+    def summary(self, file=sys.stdout):
+        print('%-28s %10s %10s %12s %12s %12s' %
+              ('function', 'calls', 'points', 'iterations', 'time [s]',
+               'per call [s]'), file=file)
+        for s in self.stats:
+            print('%-28s %10d %10d %12d %12.4g %12.4g' %
+                  (s.name, s.calls, s.points, s.iterations, s.time,
+                   s.time/s.calls), file=file)
+
+    def write_trace(self, filename):
+        # Chrome trace event format, open it in chrome://tracing or Perfetto.
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': self._events or [],
+                       'displayTimeUnit': 'ms'}, f)
+
+
+def instrumented(name):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _session is None:
+                return func(*args, **kwargs)
+            return _session.call(name, func, args, kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def instrument(summary=True, trace=None, file=sys.stdout):
+    """Record the instrumented functions called inside the block.
+
+    Yields the Session. On exit prints the summary table to file if summary
+    is true and writes a Chrome trace to the filename trace if it is given.
+    """
+    global _session
+    previous = _session
+    session = Session(trace is not None)
+    _session = session
+    try:
+        yield session
+    finally:
+        _session = previous
+        if summary:
+            session.summary(file)
+        if trace is not None:
+            session.write_trace(trace)
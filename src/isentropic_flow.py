@@ -3,53 +3,176 @@
 
 from __future__ import absolute_import, division
 
-from math import sqrt
+import numpy as np
 
-from scipy.optimize import brentq
+from common import func1, func12m, InvalidCall, MIN_MACH, MAX_MACH
+from gas import AIR, newton, single_gas
+from instrument import instrumented
+from solvers import brentq, continuation
 
-from common import func1, MIN_MACH, MAX_MACH
-from constants import GAMMA
 
+# Every relation takes the gas as a gas.GasModel, air by default. A batched
+# gas broadcasts against the other arguments.
 
-def m2p(m):
-    x = -(GAMMA/(GAMMA-1))
-    return func1(m) ** x
+def m2p(m, gas=AIR):
+    return func1(m, gas) ** gas.p_exp
 
 
-def m2rho(m):
-    x = -(1/(GAMMA-1))
-    return func1(m) ** x
+def m2rho(m, gas=AIR):
+    return func1(m, gas) ** gas.rho_exp
 
 
-def m2t(m):
-    return func1(m) ** (-1)
+def m2t(m, gas=AIR):
+    return 1 / func1(m, gas)
 
 
-def m2a(m):
-    x = (GAMMA+1) / (GAMMA-1)
-    y = 1 / (m**2) * (2/(GAMMA+1)*func1(m)) ** x
-    return sqrt(y)
+def m2a(m, gas=AIR):
+    return (gas.two_gp1*func1(m, gas)) ** gas.a_exp / m
 
 
-def p2m(p):
-    return brentq(lambda x: m2p(x)-p, MIN_MACH, MAX_MACH)
+# Logarithms of the relations above and their derivatives with respect to m,
+# used by the vectorized inverses.
 
+def _log_m2p(m, gas=AIR):
+    f = func1(m, gas)
+    return gas.p_exp*np.log(f), -gas.gamma*m/f
 
-def rho2m(rho):
-    return brentq(lambda x: m2rho(x)-rho, MIN_MACH, MAX_MACH)
 
+def _log_m2rho(m, gas=AIR):
+    f = func1(m, gas)
+    return gas.rho_exp*np.log(f), -m/f
 
-def t2m(t):
-    return brentq(lambda x: m2t(x)-t, MIN_MACH, MAX_MACH)
 
-
-def a2m(a, supersonic=1):
-    if supersonic == 1:
-        m = brentq(lambda x: m2a(x)-a, 1, MAX_MACH)
-    elif supersonic == 0:
-        m = brentq(lambda x: m2a(x)-a, MIN_MACH, 1)
+def _log_m2t(m, gas=AIR):
+    f = func1(m, gas)
+    return -np.log(f), -gas.gm1*m/f
+
+
+def _log_m2a(m, gas=AIR):
+    f = func1(m, gas)
+    return np.log(m2a(m, gas)), (m**2-1)/(m*f)
+
+
+def _log_m2ap(m, gas=AIR):
+    f = func1(m, gas)
+    return np.log(_m2ap(m, gas)), -1/m-gas.half_gm1*m/f
+
+
+def _log(x):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.log(x)
+
+
+def _m2ap(m, gas=AIR):
+    return m2a(m, gas) * m2p(m, gas)
+
+
+# The inverses take scalars or arrays of any shape. method selects how they
+# are solved:
+#   'analytic'  closed form, the default wherever one exists.
+#   'newton'    solvers.newton on the whole array, agrees with brentq to
+#               within 1E-10 in Mach number.
+#   'brentq'    scipy.optimize.brentq point by point, kept as the reference.
+# a2m and ap2m also accept the interpolation tables of the tables module:
+#   'exact'         the default exact method.
+#   'table'         monotone table lookup, see tables.TABLE_RTOL.
+#   'table+polish'  table lookup followed by one Newton step.
+# a2m also marches along an array of neighbouring stations:
+#   'continuation'  brentq in a tight bracket around the previous root, see
+#                   solvers.continuation. With full_output=True a2m returns
+#                   the brentq iterations per element as well.
+# A batched gas works with 'analytic' and 'newton' only.
+
+@instrumented('ise_flow.p2m')
+def p2m(p, method='analytic', gas=AIR):
+    if method == 'analytic':
+        return func12m(np.asarray(p, float)[()] ** gas.p_inv_exp, gas)
+    elif method == 'newton':
+        return newton(_log_m2p, _log(p), 1, MIN_MACH, MAX_MACH, gas)
+    elif method == 'brentq':
+        gas = single_gas(gas, method)
+        return brentq(lambda m: m2p(m, gas), p, MIN_MACH, MAX_MACH)
+    raise InvalidCall('Unknown method %r' % method)
+
+
+@instrumented('ise_flow.rho2m')
+def rho2m(rho, method='analytic', gas=AIR):
+    if method == 'analytic':
+        return func12m(np.asarray(rho, float)[()] ** gas.rho_inv_exp, gas)
+    elif method == 'newton':
+        return newton(_log_m2rho, _log(rho), 1, MIN_MACH, MAX_MACH, gas)
+    elif method == 'brentq':
+        gas = single_gas(gas, method)
+        return brentq(lambda m: m2rho(m, gas), rho, MIN_MACH, MAX_MACH)
+    raise InvalidCall('Unknown method %r' % method)
+
+
+@instrumented('ise_flow.t2m')
+def t2m(t, method='analytic', gas=AIR):
+    if method == 'analytic':
+        return func12m(1/np.asarray(t, float)[()], gas)
+    elif method == 'newton':
+        return newton(_log_m2t, _log(t), 1, MIN_MACH, MAX_MACH, gas)
+    elif method == 'brentq':
+        gas = single_gas(gas, method)
+        return brentq(lambda m: m2t(m, gas), t, MIN_MACH, MAX_MACH)
+    raise InvalidCall('Unknown method %r' % method)
+
+
+@instrumented('ise_flow.a2m')
+def a2m(a, supersonic=1, method=None, full_output=False, gas=AIR):
+    # There is no closed form, so scalars default to brentq and arrays to
+    # newton.
+    if method in (None, 'exact'):
+        scalar = np.ndim(a) == 0 and not gas.batched
+        method = 'brentq' if scalar else 'newton'
+    if full_output and method not in ('brentq', 'continuation'):
+        raise InvalidCall('full_output needs brentq or continuation')
+
+    if method == 'newton':
+        log_a = _log(a)
+        # Close to m = 1, ln(A/A*) = 2/(gamma+1)*(m-1)**2.
+        near = np.sqrt(gas.half_gp1*np.maximum(log_a, 0))
+        if supersonic == 1:
+            far = (np.asarray(a)/gas.a_sup) ** gas.half_gm1
+            m = newton(_log_m2a, log_a, np.minimum(1+near, far), 1, MAX_MACH,
+                       gas)
+        elif supersonic == 0:
+            far = gas.a_sub / np.asarray(a)
+            m = newton(_log_m2a, log_a, np.maximum(1-near, far), MIN_MACH, 1,
+                       gas)
+    elif method in ('brentq', 'continuation'):
+        gas = single_gas(gas, method)
+        solve = brentq if method == 'brentq' else continuation
+        if supersonic == 1:
+            m = solve(lambda m: m2a(m, gas), a, 1, MAX_MACH,
+                      full_output=full_output)
+        elif supersonic == 0:
+            m = solve(lambda m: m2a(m, gas), a, MIN_MACH, 1,
+                      full_output=full_output)
+    elif method in ('table', 'table+polish'):
+        from tables import lookup
+        name = 'ise_flow.a2m(sup)' if supersonic else 'ise_flow.a2m(sub)'
+        m = lookup(name, a, method == 'table+polish',
+                   single_gas(gas, method))
+    else:
+        raise InvalidCall('Unknown method %r' % method)
     return m
 
 
-def ap2m(ap):
-    return brentq(lambda x: m2a(x)*m2p(x)-ap, MIN_MACH, MAX_MACH)
+@instrumented('ise_flow.ap2m')
+def ap2m(ap, method='analytic', gas=AIR):
+    if method in ('analytic', 'exact'):
+        # A/A* * p/p0 = a_sub / (m*sqrt(func1(m))), a quadratic in m**2.
+        k = (gas.a_sub/np.asarray(ap, float)[()]) ** 2
+        return np.sqrt(2*k/(np.sqrt(1+2*gas.gm1*k)+1))
+    elif method == 'newton':
+        return newton(_log_m2ap, _log(ap), 1, MIN_MACH, MAX_MACH, gas)
+    elif method == 'brentq':
+        gas = single_gas(gas, method)
+        return brentq(lambda m: _m2ap(m, gas), ap, MIN_MACH, MAX_MACH)
+    elif method in ('table', 'table+polish'):
+        from tables import lookup
+        return lookup('ise_flow.ap2m', ap, method == 'table+polish',
+                      single_gas(gas, method))
+    raise InvalidCall('Unknown method %r' % method)
@@ -3,45 +3,100 @@
 
 from __future__ import absolute_import, division
 
-from math import sqrt, log, exp
+import numpy as np
 
-from scipy.optimize import brentq
+from common import func1, InvalidCall, MAX_MACH
+from gas import AIR, newton, single_gas
+from instrument import instrumented
+from solvers import brentq
 
-from common import func1, MAX_MACH
-from constants import GAMMA, CP, R
 
+def m2m2(m, gas=AIR):
+    n = func1(m, gas)
+    d = gas.gamma * m ** 2 - gas.half_gm1
+    return np.sqrt(n/d)
 
-def m2m2(m):
-    n = func1(m)
-    d = GAMMA * m ** 2 - (GAMMA-1) / 2
-    return sqrt(n/d)
 
+def m2p(m, gas=AIR):
+    return 1 + gas.two_g_gp1 * (m**2-1)
 
-def m2p(m):
-    return 1 + 2 * GAMMA * (m**2-1) / (GAMMA+1)
 
-
-def m2rho(m):
-    n = (GAMMA+1) * m ** 2
-    d = 2 * func1(m)
+def m2rho(m, gas=AIR):
+    n = gas.half_gp1 * m ** 2
+    d = func1(m, gas)
     return n / d
 
 
-def m2t(m):
-    return m2p(m) / m2rho(m)
-
-
-def m2p0(m):
-    x = 1 + 2 * GAMMA * (m**2-1) / (GAMMA+1)
-    n = 2 + (GAMMA-1) * m**2
-    d = (GAMMA+1) * m**2
-    delta_s = CP * log(x*n/d) - R * log(x)
-    return exp(-delta_s/R)
-
-
-def p02m(p0):
-    return brentq(lambda x: m2p0(x)-p0, 1, MAX_MACH)
-
-
-def m22m1(m2):
-    return brentq(lambda x: m2m2(x)-m2, 1, MAX_MACH)
\ No newline at end of file
+def m2t(m, gas=AIR):
+    return m2p(m, gas) / m2rho(m, gas)
+
+
+def m2p0(m, gas=AIR):
+    x = 1 + gas.two_g_gp1 * (m**2-1)
+    n = func1(m, gas)
+    d = gas.half_gp1 * m**2
+    delta_s = gas.cp * np.log(x*n/d) - gas.r * np.log(x)
+    return np.exp(-delta_s/gas.r)
+
+
+def _log_m2m2(m, gas=AIR):
+    n = func1(m, gas)
+    d = gas.gamma * m ** 2 - gas.half_gm1
+    return np.log(np.sqrt(n/d)), (gas.gm1*m/n - 2*gas.gamma*m/d) / 2
+
+
+def _log_m2p0(m, gas=AIR):
+    x = 1 + gas.two_g_gp1 * (m**2-1)
+    n = func1(m, gas)
+    d = gas.half_gp1 * m**2
+    dx = 2 * gas.two_g_gp1 * m
+    value = -gas.cp_r * np.log(x*n/d) + np.log(x)
+    derivative = -gas.cp_r * (dx/x + gas.gm1*m/n - 2/m) + dx/x
+    return value, derivative
+
+
+# method selects how the inverses are solved, as in isentropic_flow, plus
+# the interpolation tables of the tables module:
+#   'exact'         the default exact method.
+#   'table'         monotone table lookup, see tables.TABLE_RTOL.
+#   'table+polish'  table lookup followed by one Newton step.
+
+@instrumented('nsw.p02m')
+def p02m(p0, method=None, gas=AIR):
+    if method in (None, 'exact'):
+        scalar = np.ndim(p0) == 0 and not gas.batched
+        method = 'brentq' if scalar else 'newton'
+
+    if method == 'newton':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_p0 = np.log(p0)
+        return newton(_log_m2p0, log_p0, 2, 1, MAX_MACH, gas)
+    elif method == 'brentq':
+        gas = single_gas(gas, method)
+        return brentq(lambda m: m2p0(m, gas), p0, 1, MAX_MACH)
+    elif method in ('table', 'table+polish'):
+        from tables import lookup
+        return lookup('nsw.p02m', p0, method == 'table+polish',
+                      single_gas(gas, method))
+    raise InvalidCall('Unknown method %r' % method)
+
+
+@instrumented('nsw.m22m1')
+def m22m1(m2, method='analytic', gas=AIR):
+    if method in ('analytic', 'exact'):
+        # The normal shock relation is its own inverse.
+        m2 = np.asarray(m2, float)[()]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(m2 <= 1, m2m2(m2, gas), np.nan)[()]
+    elif method == 'newton':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_m2 = np.log(m2)
+        return newton(_log_m2m2, log_m2, 2, 1, MAX_MACH, gas)
+    elif method == 'brentq':
+        gas = single_gas(gas, method)
+        return brentq(lambda m: m2m2(m, gas), m2, 1, MAX_MACH)
+    elif method in ('table', 'table+polish'):
+        from tables import lookup
+        return lookup('nsw.m22m1', m2, method == 'table+polish',
+                      single_gas(gas, method))
+    raise InvalidCall('Unknown method %r' % method)
\ No newline at end of file
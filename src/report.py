@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+
+from __future__ import absolute_import, division
+
+import shutil
+
+import numpy as np
+
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib import pyplot as plt
+
+from common import View, Controller
+from instrument import instrumented
+from sampling import adaptive_profile
+from wind_tunnel import WindTunnel
+from combination import Combination
+
+
+class Report(View):
+
+    def __init__(self):
+        pass
+
+    @instrumented('Report.wall_shape')
+    def wall_shape(self, points):
+        n = len(points)
+        points = np.vstack([points, points[0]])
+        fig = plt.figure()
+
+        for i in range(n):
+            sub = fig.add_subplot(111)
+            x = [points[i, 0], points[i+1, 0]]
+            y = [points[i, 1], points[i+1, 1]]
+            sub.plot(x, y, 'b')
+
+        #t_len = self.wt.t_len
+        #max_y = self.wt.ymax
+
+        #h_margin = t_len * 0.1 / 2
+        #v_margin = max_y * 0.1
+        #plt.axis([-h_margin, t_len+h_margin,
+        #          -max_y-v_margin, max_y+v_margin])
+        return fig
+
+    @instrumented('Report.graph')
+    def graph(self, x, profile):
+        graph = plt.figure()
+        sub = graph.add_subplot(111)
+        sub.plot(x, profile, 'b')
+        return graph
+
+
+class WindTunnelReportCreator(Controller):
+
+    def __init__(self, model, view):
+        Controller.__init__(self, model, view)
+
+    @property
+    def plot_types(self):
+        return ['s', 'a', 'm', 'p', 'rho', 't']
+
+    @instrumented('WindTunnelReportCreator.flow_table')
+    def flow_table(self, steps=1000, tol=None):
+        # Uniform stations, or adaptive ones refined to tol, see sampling.
+        if tol is not None:
+            return adaptive_profile(self._model, tol)
+        return self._model.profile(np.linspace(0, self._model.t_len, steps))
+
+    @instrumented('WindTunnelReportCreator.save_plot')
+    def save_plot(self, filename, plot_type, steps=1000, table=None):
+        if plot_type == 's':
+            points = self._model.get_wall_shape()
+            fig = self._view.wall_shape(points)
+            fig.savefig(filename)
+        elif table is not None:
+            graph = self._view.graph(table.x, getattr(table, plot_type))
+            graph.savefig(filename)
+        else:
+            xs = np.linspace(0, self._model.t_len, steps)
+            profile = np.zeros(steps)
+
+            if plot_type == 'a':
+                for i in range(steps):
+                    profile[i] = self._model.x2a(xs[i])
+            elif plot_type == 'm':
+                for i in range(steps):
+                    profile[i] = self._model.x2m(xs[i])
+            elif plot_type == 'p':
+                for i in range(steps):
+                    profile[i] = self._model.x2p(xs[i])
+            elif plot_type == 'rho':
+                for i in range(steps):
+                    profile[i] = self._model.x2rho(xs[i])
+            elif plot_type == 't':
+                for i in range(steps):
+                    profile[i] = self._model.x2t(xs[i])
+
+            graph = self._view.graph(xs, profile)
+            graph.savefig(filename)
+
+    def generate(self, steps=1000, single_pass=True, cache=None, tol=None):
+        # In a single pass every station is solved once and all the plots
+        # are drawn from the same flow table. With a cache.ReportCache an
+        # unchanged combination is copied from the cache instead.
+        filenames = dict((t, '%s.png' % t) for t in self.plot_types)
+        if cache is not None:
+            key = cache.key(self._model, steps, tol)
+            entry = cache.get(key)
+            if entry is not None and set(entry[1]) >= set(filenames):
+                table, plots = entry
+                for t, filename in filenames.items():
+                    shutil.copyfile(plots[t], filename)
+                return table
+
+        if tol is not None:
+            single_pass = True
+        table = self.flow_table(steps, tol) if single_pass else None
+        for t in self.plot_types:
+            self.save_plot(filenames[t], t, steps, table)
+
+        if cache is not None:
+            if table is None:
+                table = self.flow_table(steps)
+            cache.put(key, table, filenames)
+        return table
+
+
+def demo():
+    import uuid
+    #pb = .068399E6
+    pb = 0.99E6
+    t = WindTunnel(2.4,               # md
+                   0.24,              # ats
+                   1e6,               # p0
+                   300,               # t0
+                   20,                # ain
+                   5,                 # con_len
+                   5,                 # div_len
+                   1,                 # z_len
+                   0.99E6)            # pb
+    com = Combination(t)
+    com.add_test_section(5)           # ts_len
+    com.add_diffuser(0.17,            # at
+                     5,               # ae
+                     5,               # con_len
+                     5,               # div_len
+                     0.99E6)          # pb
+    r = Report()
+    c = WindTunnelReportCreator(com, r)
+    c.generate()
+
+
+if __name__ == '__main__':
+    demo()
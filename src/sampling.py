@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+
+from __future__ import absolute_import, division
+
+import numpy as np
+
+from common import FlowProfile
+
+
+# Stations are refined until the midpoint of every interval is within
+# TOLERANCE of the straight line between its ends, relative to the range of
+# each quantity. 1E-3 is below a pixel of a plot 1000 pixels high.
+TOLERANCE = 1E-3
+INITIAL_STATIONS = 64
+MAX_STATIONS = 10**5
+QUANTITIES = ('m', 'p', 't', 'rho')
+
+
+# Rows of the quantities checked in np.array(profile).
+_ROWS = [FlowProfile._fields.index(q) for q in QUANTITIES]
+
+
+def adaptive_profile(model, tol=TOLERANCE, n_initial=INITIAL_STATIONS,
+                     max_stations=MAX_STATIONS):
+    """Profile of model at stations refined where linear interpolation is
+    off by more than tol.
+
+    The stations always include model.breakpoints, i.e. the segment
+    boundaries, the throats and the normal shocks. Every interior breakpoint
+    is doubled with the next float above it, so a jump is drawn as a vertical
+    line. Each round of refinement is a single call to model.profile.
+    """
+    t_len = model.t_len
+    breakpoints = np.asarray(model.breakpoints, float)
+    breakpoints = breakpoints[(breakpoints >= 0) & (breakpoints <= t_len)]
+    interior = breakpoints[(breakpoints > 0) & (breakpoints < t_len)]
+    x = np.unique(np.concatenate([np.linspace(0, t_len, n_initial),
+                                  breakpoints,
+                                  np.nextafter(interior, np.inf)]))
+    values = np.array(model.profile(x))
+    scale = np.ptp(values[_ROWS], axis=1)
+    scale[scale == 0] = 1
+
+    # Left ends of the intervals still to be checked.
+    left = np.arange(len(x)-1)
+    while left.size and len(x) < max_stations:
+        left = left[:max_stations-len(x)]
+        mid = (x[left]+x[left+1]) / 2
+        keep = (mid > x[left]) & (mid < x[left+1])
+        left, mid = left[keep], mid[keep]
+        if not left.size:
+            break
+
+        mid_values = np.array(model.profile(mid))
+        line = (values[_ROWS][:, left]+values[_ROWS][:, left+1]) / 2
+        error = np.max(np.abs(mid_values[_ROWS]-line) / scale[:, None],
+                       axis=0)
+        refine = error > tol
+
+        values = np.concatenate([values, mid_values], axis=1)
+        order = np.argsort(values[0], kind='mergesort')
+        values = values[:, order]
+        x = values[0]
+
+        # Both halves of every interval that failed are checked next round.
+        position = np.empty(len(order), int)
+        position[order] = np.arange(len(order))
+        new_mid = position[-len(mid):][refine]
+        left = np.sort(np.concatenate([new_mid-1, new_mid]))
+
+    return FlowProfile(*values)
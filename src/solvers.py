@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+
+from __future__ import absolute_import, division
+
+from collections import Counter
+
+import numpy as np
+
+from instrument import instrumented
+
+
+# Same stopping rule as scipy.optimize.brentq: |dx| <= XTOL + RTOL*|x|.
+XTOL = 2E-12
+RTOL = 4 * np.finfo(float).eps
+MAXITER = 100
+
+# Number of points solved by each solver, and the brentq iterations they
+# took. Clear them before a run to count the root finds the run makes.
+counter = Counter()
+iterations = Counter()
+
+
+class NoBracket(ValueError):
+    pass
+
+
+@instrumented('solvers.newton')
+def newton(func, target, x0, lo, hi, xtol=XTOL, rtol=RTOL, maxiter=MAXITER,
+           args=()):
+    """Solve func(x) == target elementwise for monotonic func on [lo, hi].
+
+    func(x, *args) must return the value and the derivative at x. args are
+    arrays broadcast against target, passed to func at the same elements as
+    x. Every element is iterated with Newton's method, and a step that leaves
+    the current bracket falls back to bisection. Elements are dropped from
+    the iteration as soon as they converge. Elements without a root in
+    [lo, hi] are returned as nan. Scalars are returned as scalars.
+    """
+    arrays = np.broadcast_arrays(np.asarray(target, float),
+                                 np.asarray(x0, float),
+                                 np.asarray(lo, float),
+                                 np.asarray(hi, float),
+                                 *[np.asarray(arg) for arg in args])
+    target, x0, lo, hi = arrays[:4]
+    args = [arg.ravel() for arg in arrays[4:]]
+    shape = target.shape
+    target = target.ravel()
+    counter['newton'] += target.size
+    x = np.clip(x0.ravel(), lo.ravel(), hi.ravel())
+    lo = lo.ravel().copy()
+    hi = hi.ravel().copy()
+
+    f_lo = func(lo, *args)[0] - target
+    f_hi = func(hi, *args)[0] - target
+    sign_lo = np.sign(f_lo)
+
+    res = np.full(target.shape, np.nan)
+    res[f_lo == 0] = lo[f_lo == 0]
+    res[f_hi == 0] = hi[f_hi == 0]
+    active = np.nonzero(sign_lo*np.sign(f_hi) < 0)[0]
+
+    for _ in range(maxiter):
+        if not active.size:
+            break
+        xa, la, ha, sa = x[active], lo[active], hi[active], sign_lo[active]
+        f, df = func(xa, *[arg[active] for arg in args])
+        f = f - target[active]
+
+        # Shrink the bracket around the root.
+        below = np.sign(f) == sa
+        la = np.where(below, xa, la)
+        ha = np.where(below, ha, xa)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            xn = xa - f/df
+        bisect = ~((xn > la) & (xn < ha))
+        xn[bisect] = (la[bisect]+ha[bisect]) / 2
+
+        tol = xtol + rtol*np.abs(xn)
+        done = (f == 0) | (np.abs(xn-xa) <= tol) | (ha-la <= tol)
+        xn[f == 0] = xa[f == 0]
+
+        x[active], lo[active], hi[active] = xn, la, ha
+        res[active[done]] = xn[done]
+        active = active[~done]
+
+    res[active] = x[active]
+    return res.reshape(shape)[()]
+
+
+def _solve(func, target, lo, hi):
+    # scipy is only loaded by the first brentq solve, so the closed-form and
+    # Newton paths never import it.
+    from scipy.optimize import brentq as _brentq
+    try:
+        root, r = _brentq(lambda x: func(x)-target, lo, hi,
+                          full_output=True)
+    except ValueError:
+        if np.sign(func(lo)-target) * np.sign(func(hi)-target) > 0:
+            raise NoBracket('No root of f(x) = %g in [%g, %g]' %
+                            (target, lo, hi))
+        raise
+    # scipy leaves iterations unset when an end of the bracket is the root.
+    return root, r.iterations if r.function_calls > 2 else 0
+
+
+@instrumented('solvers.brentq')
+def brentq(func, target, lo, hi, full_output=False):
+    """Solve func(x) == target with scipy.optimize.brentq, one element at a
+    time for array targets. With full_output the brentq iterations of every
+    element are returned as well."""
+    target = np.asarray(target, float)
+    counter['brentq'] += target.size
+    res = np.empty(target.shape)
+    its = np.zeros(target.shape, int)
+    for i, t in np.ndenumerate(target):
+        res[i], its[i] = _solve(func, t, lo, hi)
+    iterations['brentq'] += its.sum()
+    if full_output:
+        return res[()], its[()]
+    return res[()]
+
+
+@instrumented('solvers.continuation')
+def continuation(func, target, lo, hi, x0=None, full_output=False):
+    """Solve func(x) == target for monotonic func with brentq, marching
+    through the elements of target in order.
+
+    Every element is bracketed around the root extrapolated from the two
+    previous ones, as wide as the last step. A bracket without a sign change
+    is widened 8 times, up to 4 times, and then replaced by [lo, hi]. x0 is
+    the guess for the first element. With full_output the brentq iterations
+    of every element are returned as well.
+    """
+    target = np.asarray(target, float)
+    counter['continuation'] += target.size
+    res = np.empty(target.shape)
+    its = np.zeros(target.shape, int)
+    prev = [] if x0 is None else [float(x0)]
+
+    for i, t in np.ndenumerate(target):
+        bracket = lo, hi
+        if prev:
+            if len(prev) > 1:
+                step = abs(prev[-1]-prev[-2])
+                guess = 2*prev[-1] - prev[-2]
+            else:
+                step = 1E-2 * abs(prev[-1])
+                guess = prev[-1]
+            width = max(step, 4*(XTOL+RTOL*abs(guess)))
+            for _ in range(5):
+                a, b = max(lo, guess-width), min(hi, guess+width)
+                if (func(a)-t) * (func(b)-t) <= 0:
+                    bracket = a, b
+                    break
+                width *= 8
+        res[i], its[i] = _solve(func, t, *bracket)
+        prev = [prev[-1], res[i]] if prev else [res[i]]
+
+    iterations['continuation'] += its.sum()
+    if full_output:
+        return res[()], its[()]
+    return res[()]
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+
+from __future__ import absolute_import, division
+
+import bisect
+import json
+import os
+
+import numpy as np
+
+
+# A store is a directory of shards plus index.json. Shard k holds the
+# profiles of a contiguous run of points as shard-k.npy, shaped
+# (points, quantities, stations), and their parameters as params-k.npy.
+# The index is rewritten after every shard, so a store is readable while it
+# is being written and after a crash.
+INDEX = 'index.json'
+VERSION = 1
+
+
+class InvalidStore(Exception):
+    pass
+
+
+class ProfileStoreWriter(object):
+
+    def __init__(self, directory, x, quantities=('m', 'p', 't', 'rho'),
+                 parameters=()):
+        if os.path.exists(os.path.join(directory, INDEX)):
+            raise InvalidStore('%s already holds a store' % directory)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._directory = directory
+        self._index = {'version': VERSION,
+                       'x': [float(v) for v in np.ravel(x)],
+                       'quantities': list(quantities),
+                       'parameters': list(parameters),
+                       'shards': [],
+                       'errors': {},
+                       'size': 0}
+        self._write_index()
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def size(self):
+        return self._index['size']
+
+    def append(self, columns, parameters=None, errors=None):
+        """Write one chunk of points as a new shard.
+
+        columns maps every quantity to an array of shape (points, stations),
+        or (stations,) for a single point, so a FlowProfile._asdict() can be
+        passed as it is. parameters has one row per point and errors one
+        string per point, '' for points without an error.
+        """
+        index = self._index
+        n_x = len(index['x'])
+        data = np.stack([np.asarray(columns[q], float).reshape(-1, n_x)
+                         for q in index['quantities']], axis=1)
+        count = len(data)
+        if parameters is None:
+            parameters = np.empty((count, 0))
+        parameters = np.asarray(parameters, float).reshape(
+            count, len(index['parameters']))
+
+        k = len(index['shards'])
+        name = 'shard-%05d.npy' % k
+        np.save(os.path.join(self._directory, name), data)
+        np.save(os.path.join(self._directory, 'params-%05d.npy' % k),
+                parameters)
+        index['shards'].append({'file': name,
+                                'start': index['size'],
+                                'count': count})
+        for i, error in enumerate(errors if errors is not None else ()):
+            if error:
+                index['errors'][str(index['size']+i)] = error
+        index['size'] += count
+        self._write_index()
+
+    def _write_index(self):
+        filename = os.path.join(self._directory, INDEX)
+        with open(filename + '.tmp', 'w') as f:
+            json.dump(self._index, f)
+        os.rename(filename + '.tmp', filename)
+
+    def close(self):
+        self._write_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ProfileStore(object):
+
+    def __init__(self, directory):
+        self._directory = directory
+        try:
+            with open(os.path.join(directory, INDEX)) as f:
+                self._index = json.load(f)
+        except (IOError, OSError, ValueError):
+            raise InvalidStore('%s does not hold a store' % directory)
+        if self._index.get('version') != VERSION:
+            raise InvalidStore('Unsupported store version %r' %
+                               self._index.get('version'))
+        self._starts = [s['start'] for s in self._index['shards']]
+        self._shards = {}
+
+    def __len__(self):
+        return self._index['size']
+
+    @property
+    def x(self):
+        return np.array(self._index['x'])
+
+    @property
+    def quantities(self):
+        return list(self._index['quantities'])
+
+    @property
+    def errors(self):
+        errors = np.full(len(self), '', object)
+        for i, error in self._index['errors'].items():
+            errors[int(i)] = error
+        return errors
+
+    @property
+    def grid(self):
+        names = self._index['parameters']
+        params = [np.load(os.path.join(self._directory, 'params-%05d.npy' %
+                                       k))
+                  for k in range(len(self._index['shards']))]
+        params = np.concatenate(params) if params else \
+            np.empty((0, len(names)))
+        return dict(zip(names, params.T))
+
+    def _shard(self, k):
+        # Shards are memory-mapped on first use, nothing is read up front.
+        if k not in self._shards:
+            filename = os.path.join(self._directory,
+                                    self._index['shards'][k]['file'])
+            self._shards[k] = np.load(filename, mmap_mode='r')
+        return self._shards[k]
+
+    def _quantity(self, quantity):
+        try:
+            return self._index['quantities'].index(quantity)
+        except ValueError:
+            raise KeyError('Unknown quantity %r' % quantity)
+
+    def point(self, i):
+        # Every quantity at every station of design point i.
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        k = bisect.bisect_right(self._starts, i) - 1
+        row = np.array(self._shard(k)[i-self._starts[k]])
+        return dict(zip(self._index['quantities'], row))
+
+    def station(self, j, quantity):
+        # One quantity at station j for every design point.
+        q = self._quantity(quantity)
+        columns = [self._shard(k)[:, q, j]
+                   for k in range(len(self._index['shards']))]
+        return np.concatenate(columns) if columns else np.empty(0)
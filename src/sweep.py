@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+
+
+from __future__ import absolute_import, division
+
+from collections import namedtuple
+
+import itertools
+import os
+import tempfile
+
+import numpy as np
+
+import isentropic_flow as ise_flow
+from common import InvalidCall
+from gas import AIR, GasModel
+from wind_tunnel import WindTunnel
+from combination import Combination, InvalidThroatArea, \
+    InvalidWorkingCondition, check_diffuser_wc
+from solvers import NoBracket
+from store import ProfileStoreWriter
+
+
+# Result of a back pressure sweep. pb, p01, wc and xns have one entry per
+# pressure, m, p, t and rho one row per pressure and one column per station.
+SweepResult = namedtuple('SweepResult', 'pb p01 x wc xns m p t rho')
+
+# Result of a design sweep. grid maps every parameter to one value per grid
+# point, errors holds '' or the error a point raised, x the stations as
+# fractions of the total length and m, p, t and rho one row per grid point.
+DesignSweepResult = namedtuple('DesignSweepResult', 'grid errors x m p t rho')
+
+# Parameters of a WindTunnel + TestSection + Diffuser combination, set to the
+# demo in report.py. The gas is air unless GAS_PARAMETERS are given too.
+BASE_DESIGN = {'design_mach': 2.4,
+               'test_section_area': 0.24,
+               'p01': 1E6,
+               't0': 300.,
+               'in_area': 20.,
+               'con_len': 5.,
+               'div_len': 5.,
+               'z_len': 1.,
+               'back_pressure': 0.99E6,
+               'ts_len': 5.,
+               'diffuser_at': 0.17,
+               'diffuser_ae': 5.,
+               'diffuser_con_len': 5.,
+               'diffuser_div_len': 5.}
+
+GAS_PARAMETERS = ('gamma', 'r')
+
+# Chunk of a transient back pressure ramp: index of its first sample, and
+# per sample pb, working condition, shock location (nan without a shock in
+# the nozzle) and test section Mach number. events lists the samples of the
+# chunk where the working condition differs from the sample before, the
+# last one of the previous chunk included.
+RampChunk = namedtuple('RampChunk', 'start pb wc xns m_ts events')
+
+# Working condition changing from old to new at sample index.
+WorkingConditionChange = namedtuple('WorkingConditionChange',
+                                    'index pb old new')
+
+# Samples evaluated at once by a ramp. Memory use is proportional to it and
+# independent of the length of the series.
+RAMP_CHUNKSIZE = 4096
+
+# Errors that only mean a grid point is not a valid design: a diffuser
+# throat outside the nozzle's, a nozzle in a working condition a diffuser
+# cannot follow, and a brentq bracket without a root.
+DESIGN_ERRORS = (InvalidThroatArea, InvalidWorkingCondition, NoBracket)
+
+# Quantities in the profiles of a design sweep, in order.
+PROFILE_QUANTITIES = ('m', 'p', 't', 'rho')
+
+# Directory of the temporary shared result buffers: a tmpfs where there is
+# one, so that they stay in memory.
+SHARED_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+def back_pressure_sweep(tunnel, pbs, xs, p01s=None):
+    pb = np.asarray(pbs, float).ravel()
+    p01 = tunnel.p01 if p01s is None else np.asarray(p01s, float).ravel()
+    pb, p01 = np.broadcast_arrays(pb, p01)
+    state = tunnel.operating_state(pb/p01)
+    gas = tunnel.gas
+
+    x = np.asarray(xs, float).ravel()
+    a = tunnel.x2a(x)
+    con = x <= tunnel.con_len
+
+    # Geometry only: the Mach number of a choked nozzle without a shock is
+    # the same for every pressure, so it is solved once for the sweep.
+    m_choked = np.empty(x.shape)
+    m_choked[con] = ise_flow.a2m(a[con]/tunnel.at, 0, gas=gas)
+    m_choked[~con] = ise_flow.a2m(a[~con]/tunnel.at, 1, gas=gas)
+
+    m = np.empty((len(pb), len(x)))
+    sub = (state.wc == 1) | (state.wc == 2)
+    m[sub] = ise_flow.a2m(a/state.astar[sub, None], 0, gas=gas)
+    m[~sub] = m_choked
+
+    # Subsonic flow behind the normal shock for working conditions 3 and 4.
+    shock = (state.wc == 3) | (state.wc == 4)
+    behind = shock[:, None] & ~con & (x > state.xns[:, None])
+    rows, cols = np.nonzero(behind)
+    m[rows, cols] = ise_flow.a2m(a[cols]/state.a2star[rows], 0, gas=gas)
+
+    p02p01 = np.ones(m.shape)
+    p02p01[rows, cols] = state.p02p01[rows]
+    return SweepResult(pb,
+                       p01,
+                       x,
+                       state.wc,
+                       state.xns,
+                       m,
+                       ise_flow.m2p(m, gas=gas) * p02p01,
+                       ise_flow.m2t(m, gas=gas),
+                       ise_flow.m2rho(m, gas=gas) * p02p01)
+
+
+def chunked(samples, chunksize=RAMP_CHUNKSIZE):
+    """Yield successive float arrays of up to chunksize samples. Arrays,
+    including memory-mapped ones, are sliced, and any other iterable is
+    read lazily."""
+    if isinstance(samples, np.ndarray):
+        for i in range(0, len(samples), chunksize):
+            yield np.asarray(samples[i:i+chunksize], float)
+        return
+    samples = iter(samples)
+    while True:
+        chunk = np.fromiter(itertools.islice(samples, chunksize), float)
+        if not chunk.size:
+            return
+        yield chunk
+
+
+def back_pressure_ramp(tunnel, pbs, chunksize=RAMP_CHUNKSIZE):
+    """Step the back pressure of tunnel through the time series pbs and
+    yield one RampChunk per chunksize samples.
+
+    pbs may be any iterable, e.g. a generator reading a long record, and
+    only one chunk is held at a time. tunnel itself is not changed.
+    """
+    gas = tunnel.gas
+    previous = None
+    start = 0
+    for pb in chunked(pbs, chunksize):
+        # At pb = p01 nothing flows and A* is infinite.
+        with np.errstate(divide='ignore'):
+            state = tunnel.operating_state(pb/tunnel.p01)
+        wc = state.wc
+
+        # Exit Mach number of the nozzle: subsonic, behind the shock when it
+        # stands inside the nozzle, or the design Mach number. A shock at
+        # the exit is in front of it, as in WindTunnel.profile.
+        m_ts = np.full(pb.shape, float(tunnel.md))
+        sub = (wc == 1) | (wc == 2)
+        m_ts[sub] = ise_flow.p2m(state.ratio[sub], gas=gas)
+        shock = ((wc == 3) | (wc == 4)) & (state.xns < tunnel.t_len)
+        m_ts[shock] = ise_flow.a2m(tunnel.ats/state.a2star[shock], 0,
+                                   gas=gas)
+
+        before = np.concatenate([[wc[0] if previous is None else previous],
+                                 wc[:-1]])
+        events = [WorkingConditionChange(start+i, float(pb[i]),
+                                         int(before[i]), int(wc[i]))
+                  for i in np.nonzero(wc != before)[0].tolist()]
+        yield RampChunk(start, pb, wc, state.xns, m_ts, events)
+        previous = wc[-1]
+        start += len(pb)
+
+
+def ramp_events(chunks):
+    # The working condition changes of a back_pressure_ramp, one by one.
+    for chunk in chunks:
+        for event in chunk.events:
+            yield event
+
+
+def build_design(design):
+    gas = AIR
+    if 'gamma' in design or 'r' in design:
+        gas = GasModel(design.get('gamma', AIR.gamma),
+                       design.get('r', AIR.r))
+    nozzle = WindTunnel(design['design_mach'],
+                        design['test_section_area'],
+                        design['p01'],
+                        design['t0'],
+                        design['in_area'],
+                        design['con_len'],
+                        design['div_len'],
+                        design['z_len'],
+                        design['back_pressure'],
+                        gas)
+    check_diffuser_wc(nozzle.wc)
+    com = Combination(nozzle)
+    com.add_test_section(design['ts_len'])
+    com.add_diffuser(design['diffuser_at'],
+                     design['diffuser_ae'],
+                     design['diffuser_con_len'],
+                     design['diffuser_div_len'],
+                     design['back_pressure'])
+    return com
+
+
+def _evaluate_chunk(args):
+    base, names, points, fractions, filename, start = args
+    if filename is None:
+        profiles = np.empty((4, len(points), len(fractions)))
+    else:
+        # Write straight into the shared buffer instead of sending the
+        # profiles back through pickle.
+        buf = np.lib.format.open_memmap(filename, mode='r+')
+        profiles = buf[:, start:start+len(points)]
+    profiles[...] = np.nan
+
+    errors = []
+    for i, point in enumerate(points):
+        design = dict(base)
+        design.update(zip(names, point))
+        try:
+            com = build_design(design)
+            profile = com.profile(fractions*com.t_len)
+        except DESIGN_ERRORS as e:
+            message = str(e)
+            errors.append(type(e).__name__ + (': ' + message if message
+                                              else ''))
+            continue
+        errors.append('')
+        profiles[:, i] = profile.m, profile.p, profile.t, profile.rho
+
+    if filename is None:
+        return errors, profiles
+    buf.flush()
+    return errors, None
+
+
+def _collect(results, chunks, writer):
+    # Results arrive in grid order. With a writer the profiles are stored
+    # and dropped chunk by chunk.
+    collected = []
+    for chunk, (errors, profiles) in zip(chunks, results):
+        if writer is not None:
+            writer.append(dict(zip(PROFILE_QUANTITIES, profiles)),
+                          chunk[2], errors)
+            profiles = None
+        collected.append((errors, profiles))
+    return collected
+
+
+def design_sweep(grid, n_stations=1000, base=None, workers=1, chunksize=64,
+                 shared=False, path=None, store=None):
+    """Evaluate the combination at every point of the cartesian product of
+    grid, a mapping from parameter names in BASE_DESIGN or GAS_PARAMETERS
+    to their values.
+
+    Chunks of chunksize points are fanned out to a process pool of workers
+    processes, or evaluated in this process if workers is 1. Results are
+    returned in grid order whatever the number of workers.
+
+    With shared or a path, the workers write the profiles into one
+    memory-mapped .npy file, at path or in SHARED_DIR, and m, p, t and rho
+    are views of it. A temporary file is unlinked at once and freed with
+    the last view.
+
+    With store, a directory, every chunk is written to a ProfileStore as
+    soon as it is done and m, p, t and rho are None, so sweeps larger than
+    memory can be run.
+    """
+    if store is not None and (shared or path is not None):
+        raise InvalidCall('A store cannot be combined with a shared buffer')
+    base = dict(BASE_DESIGN if base is None else base)
+    names = sorted(grid)
+    for name in names:
+        if name not in base and name not in GAS_PARAMETERS:
+            raise KeyError('Unknown design parameter %r' % name)
+    points = np.array(list(itertools.product(*[grid[n] for n in names])),
+                      float).reshape(-1, len(names))
+    fractions = np.linspace(0, 1, n_stations)
+
+    # A temporary buffer is removed even when the sweep fails or is
+    # interrupted, as a file in SHARED_DIR holds memory until it is.
+    temporary = shared and path is None
+    filename = path
+    if temporary:
+        fd, filename = tempfile.mkstemp(suffix='.npy', dir=SHARED_DIR)
+        os.close(fd)
+    try:
+        if filename is not None:
+            shape = (4, len(points), n_stations)
+            np.lib.format.open_memmap(filename, 'w+', float, shape).flush()
+
+        chunks = [(base, names, points[i:i+chunksize], fractions, filename, i)
+                  for i in range(0, len(points), chunksize)]
+        writer = None
+        if store is not None:
+            writer = ProfileStoreWriter(store, fractions, PROFILE_QUANTITIES,
+                                        names)
+        if workers == 1:
+            results = _collect((_evaluate_chunk(c) for c in chunks), chunks,
+                               writer)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = _collect(executor.map(_evaluate_chunk, chunks),
+                                   chunks, writer)
+
+        errors = np.array([e for chunk in results for e in chunk[0]], object)
+        if writer is not None:
+            writer.close()
+            profiles = [None] * len(PROFILE_QUANTITIES)
+        elif filename is not None:
+            profiles = np.load(filename, mmap_mode='r+')
+        elif results:
+            profiles = np.concatenate([chunk[1] for chunk in results], axis=1)
+        else:
+            profiles = np.empty((4, 0, n_stations))
+    finally:
+        if temporary:
+            os.remove(filename)
+    return DesignSweepResult(dict(zip(names, points.T)),
+                             errors,
+                             fractions,
+                             *profiles)
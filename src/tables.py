@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+
+
+from __future__ import absolute_import, division
+
+import os
+from collections import namedtuple
+
+import numpy as np
+
+import isentropic_flow as ise_flow
+import normal_shock_wave as nsw
+from common import MIN_MACH, MAX_MACH
+from gas import AIR
+
+
+# Every table is refined until the relative error in Mach number, checked at
+# four points inside every interval, is below TABLE_RTOL / 4. The error
+# actually reached is kept as InverseTable.max_rel_error. The single Newton
+# polish of 'table+polish' brings the error down to that of the exact solvers.
+TABLE_RTOL = 1E-8
+MIN_NODES, MAX_NODES = 2**8, 2**20
+
+# Version of the saved tables. Bump it when their layout or the way they are
+# built changes. A file is also checked against the spec it is loaded for,
+# see _fingerprint, and rebuilt if it does not match.
+VERSION = 1
+
+# Tables are kept in memory for the life of the process and saved to
+# CACHE_DIR, if it is not None, so that they are built once per machine.
+CACHE_DIR = os.environ.get(
+    'AERODYNAMICS_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'aerodynamics'))
+
+
+# A table maps u = y2u(y) to z = m2z(m) on a uniform grid in u. The
+# transforms remove the square and cube root singularities at m = 1 so that
+# z is smooth in u. log_forward is the logarithm of the forward relation and
+# its derivative, used for the Newton polish. Tables are built per gas.
+Spec = namedtuple('Spec', 'exact log_forward y2u u2y m2z z2m m_lo m_hi')
+
+
+def _sqrt_log(a):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.sqrt(np.log(a))
+
+
+def _cbrt_neg_log(p0):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.cbrt(-np.log(p0))
+
+
+def _log(x):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.log(x)
+
+
+NAMES = ('ise_flow.a2m(sup)', 'ise_flow.a2m(sub)', 'ise_flow.ap2m',
+         'nsw.p02m', 'nsw.m22m1')
+
+
+def make_spec(name, gas=AIR):
+    if name == 'ise_flow.a2m(sup)':
+        return Spec(lambda a: ise_flow.a2m(a, 1, 'newton', gas=gas),
+                    lambda m: ise_flow._log_m2a(m, gas),
+                    _sqrt_log, lambda u: np.exp(u**2),
+                    np.log, np.exp,
+                    1., MAX_MACH)
+    elif name == 'ise_flow.a2m(sub)':
+        return Spec(lambda a: ise_flow.a2m(a, 0, 'newton', gas=gas),
+                    lambda m: ise_flow._log_m2a(m, gas),
+                    _sqrt_log, lambda u: np.exp(u**2),
+                    np.log, np.exp,
+                    MIN_MACH, 1.)
+    elif name == 'ise_flow.ap2m':
+        return Spec(lambda ap: ise_flow.ap2m(ap, gas=gas),
+                    lambda m: ise_flow._log_m2ap(m, gas),
+                    _log, np.exp,
+                    np.log, np.exp,
+                    MIN_MACH, MAX_MACH)
+    elif name == 'nsw.p02m':
+        return Spec(lambda p0: nsw.p02m(p0, 'newton', gas=gas),
+                    lambda m: nsw._log_m2p0(m, gas),
+                    _cbrt_neg_log, lambda u: np.exp(-u**3),
+                    np.log, np.exp,
+                    1., MAX_MACH)
+    elif name == 'nsw.m22m1':
+        return Spec(lambda m2: nsw.m22m1(m2, gas=gas),
+                    lambda m: nsw._log_m2m2(m, gas),
+                    np.asarray, np.asarray,
+                    lambda m: m**-2, lambda z: z**-.5,
+                    1., MAX_MACH)
+    raise KeyError(name)
+
+
+SPECS = dict((name, make_spec(name)) for name in NAMES)
+
+
+class StaleTable(Exception):
+    pass
+
+
+def _fingerprint(spec):
+    # The transforms and the bounds of spec at a few Mach numbers, to tell
+    # whether a saved table was built for it.
+    m = np.linspace(spec.m_lo, spec.m_hi, 7)[1:-1]
+    return np.concatenate([spec.y2u(np.exp(spec.log_forward(m)[0])),
+                           spec.m2z(m),
+                           [spec.m_lo, spec.m_hi]])
+
+
+class InverseTable(object):
+
+    def __init__(self, spec, u0, du, zs, slopes, max_rel_error):
+        self._spec = spec
+        self._u0 = u0
+        self._du = du
+        self._zs = zs
+        self._slopes = slopes
+        self._max_rel_error = max_rel_error
+
+    @property
+    def size(self):
+        return len(self._zs)
+
+    @property
+    def max_rel_error(self):
+        return self._max_rel_error
+
+    def interpolate(self, u):
+        # Cubic Hermite interpolation with the monotone (PCHIP) slopes.
+        s = (np.asarray(u, float)-self._u0) / self._du
+        with np.errstate(invalid='ignore'):
+            inside = (s >= 0) & (s <= self.size-1)
+        i = np.clip(np.floor(np.where(inside, s, 0)).astype(int),
+                    0, self.size-2)
+        t = s - i
+        t2, t3 = t*t, t*t*t
+        z = ((2*t3-3*t2+1)*self._zs[i] + (t3-2*t2+t)*self._du*self._slopes[i] +
+             (-2*t3+3*t2)*self._zs[i+1] + (t3-t2)*self._du*self._slopes[i+1])
+        return np.where(inside, z, np.nan)
+
+    def __call__(self, y, polish=False):
+        spec = self._spec
+        y = np.asarray(y, float)
+        m = spec.z2m(self.interpolate(spec.y2u(y)))
+
+        if polish:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                g, dg = spec.log_forward(m)
+                step = (g-_log(y)) / dg
+            # A step larger than the table error means the Newton step is
+            # ill-conditioned, as next to m = 1, so keep the table value.
+            ok = np.abs(step) <= 4 * self.max_rel_error * m
+            m = np.where(ok, m-step, m)
+
+        # Queries outside the table go to the exact solver.
+        outside = np.isnan(m)
+        if outside.any():
+            m = np.array(m, ndmin=1)
+            m[outside.ravel()] = spec.exact(y.ravel()[outside.ravel()])
+            m = m.reshape(y.shape)
+        return m[()]
+
+    def save(self, filename):
+        # Every process writes its own temporary file, so that concurrent
+        # builds of one table cannot interleave.
+        tmp = '%s.tmp-%d.npz' % (filename, os.getpid())
+        np.savez(tmp, version=VERSION, min_nodes=MIN_NODES,
+                 fingerprint=_fingerprint(self._spec), u0=self._u0,
+                 du=self._du, zs=self._zs, slopes=self._slopes,
+                 max_rel_error=self._max_rel_error)
+        os.rename(tmp, filename)
+
+    @classmethod
+    def load(cls, spec, filename):
+        with np.load(filename) as data:
+            if (int(data['version']) != VERSION or
+                    int(data['min_nodes']) != MIN_NODES or
+                    not np.allclose(data['fingerprint'], _fingerprint(spec),
+                                    rtol=1E-12, atol=0, equal_nan=True)):
+                raise StaleTable(filename)
+            return cls(spec, float(data['u0']), float(data['du']),
+                       data['zs'], data['slopes'],
+                       float(data['max_rel_error']))
+
+    @classmethod
+    def build(cls, spec, rtol=TABLE_RTOL):
+        from scipy.interpolate import PchipInterpolator
+
+        m_ends = np.array([spec.m_lo, spec.m_hi])
+        u_ends = spec.y2u(np.exp(spec.log_forward(m_ends)[0]))
+        order = np.argsort(u_ends)
+        u_lo, u_hi = u_ends[order]
+        z_lo, z_hi = spec.m2z(m_ends[order])
+
+        n = MIN_NODES
+        while True:
+            us = np.linspace(u_lo, u_hi, n)
+            zs = spec.m2z(spec.exact(spec.u2y(us[1:-1])))
+            zs = np.concatenate([[z_lo], zs, [z_hi]])
+            slopes = PchipInterpolator(us, zs).derivative()(us)
+            table = cls(spec, u_lo, us[1]-us[0], zs, slopes, rtol)
+
+            check = (us[:-1, None] +
+                     (us[1]-us[0])*np.array([.125, .375, .625, .875])).ravel()
+            m = spec.exact(spec.u2y(check))
+            error = np.nanmax(np.abs(spec.z2m(table.interpolate(check))-m)/m)
+            if error <= rtol/4 or n >= MAX_NODES:
+                break
+            n *= 2
+        table._max_rel_error = max(error, np.finfo(float).eps)
+        return table
+
+
+# Keyed by name and gas.
+_TABLES = {}
+
+
+def _key(name):
+    return name.replace('(', '_').replace(')', '')
+
+
+def _filename(name, gas=AIR):
+    return os.path.join(CACHE_DIR, '%s-v%d-gamma%r-r%r-cp%r-rtol%r.npz' %
+                        (_key(name), VERSION, float(gas.gamma), float(gas.r),
+                         float(gas.cp), TABLE_RTOL))
+
+
+def _remove_old_versions(name):
+    # Files of name saved by other versions, finished ones only.
+    prefix = '%s-' % _key(name)
+    current = '%sv%d-' % (prefix, VERSION)
+    for entry in os.listdir(CACHE_DIR):
+        if (entry.startswith(prefix) and not entry.startswith(current) and
+                entry.endswith('.npz') and '.tmp-' not in entry):
+            try:
+                os.remove(os.path.join(CACHE_DIR, entry))
+            except OSError:
+                pass
+
+
+def get_table(name, gas=AIR):
+    if (name, gas) not in _TABLES:
+        spec = SPECS[name] if gas == AIR else make_spec(name, gas)
+        table = None
+        if CACHE_DIR is not None:
+            filename = _filename(name, gas)
+            if os.path.exists(filename):
+                # A truncated, stale or unreadable file is a miss, and is
+                # overwritten below.
+                try:
+                    table = InverseTable.load(spec, filename)
+                except Exception:
+                    table = None
+            if table is None:
+                table = InverseTable.build(spec)
+                try:
+                    if not os.path.isdir(CACHE_DIR):
+                        os.makedirs(CACHE_DIR)
+                    table.save(filename)
+                    _remove_old_versions(name)
+                except (IOError, OSError):
+                    pass
+        else:
+            table = InverseTable.build(spec)
+        _TABLES[name, gas] = table
+    return _TABLES[name, gas]
+
+
+def lookup(name, y, polish=False, gas=AIR):
+    return get_table(name, gas)(y, polish)
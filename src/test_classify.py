@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+from common import classify
+from constants import EPSILON
+from wind_tunnel import WindTunnel
+
+
+# classify must give the working condition of the if/elif chain it replaced,
+# for scalars and arrays, on a grid of ratios that includes the thresholds
+# and the edges of the bands around them.
+DESIGN_MACHS = (1.2, 1.5, 2.4, 3.5)
+GRID_POINTS = 2001
+OFFSETS = (0, EPSILON/2, EPSILON*(1-1E-9), EPSILON, EPSILON*(1+1E-9),
+           2*EPSILON)
+
+
+def _chain(ratio, pl, pns, pd):
+    if ratio > pl:
+        wc = 1
+    elif abs(ratio-pl) < EPSILON:
+        wc = 2
+    elif pns < ratio < pl:
+        wc = 3
+    elif abs(ratio-pns) < EPSILON:
+        wc = 4
+    elif pd < ratio < pns:
+        wc = 5
+    elif abs(ratio-pd) < EPSILON:
+        wc = 6
+    elif ratio < pd:
+        wc = 7
+    return wc
+
+
+def _thresholds():
+    for md in DESIGN_MACHS:
+        yield WindTunnel(md, 0.24, 1E6, 300., 20., 5., 5., 1.,
+                         0.99E6).thresholds
+
+
+def _ratios(thresholds):
+    ratios = [np.linspace(0, 1.2, GRID_POINTS)]
+    for threshold in thresholds:
+        for offset in OFFSETS:
+            ratios.append([threshold-offset, threshold+offset])
+        ratios.append([np.nextafter(threshold, 0),
+                       np.nextafter(threshold, 2)])
+    return np.concatenate(ratios)
+
+
+def test_scalars():
+    for thresholds in _thresholds():
+        for ratio in _ratios(thresholds).tolist():
+            wc = classify(ratio, *thresholds)
+            expected = _chain(ratio, *thresholds)
+            if type(wc) is not int or wc != expected:
+                raise AssertionError('classify(%r, %r, %r, %r) gave %r, the '
+                                     'chain %r' % ((ratio,) + thresholds +
+                                                   (wc, expected)))
+
+
+def test_arrays():
+    for thresholds in _thresholds():
+        ratios = _ratios(thresholds)
+        expected = np.array([_chain(r, *thresholds) for r in ratios.tolist()])
+        for shape in ((-1,), (-1, 1), (1, -1)):
+            wc = classify(ratios.reshape(shape), *thresholds)
+            if wc.shape != ratios.reshape(shape).shape or \
+                    (wc.ravel() != expected).any():
+                raise AssertionError('classify differs from the chain for '
+                                     'thresholds %r' % (thresholds,))
+
+
+if __name__ == '__main__':
+    test_scalars()
+    test_arrays()
+    print('classify agrees with the if/elif chain.')
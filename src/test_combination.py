@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+from combination import Combination, InvalidWorkingCondition, DIFFUSER_WCS
+from wind_tunnel import WindTunnel
+
+
+# A Combination changed through change_back_pressure, change_p01 and
+# change_t0 must match one built anew at the same operating conditions,
+# also after the nozzle has left the working conditions a diffuser can
+# follow and come back. Out of them only the diffuser must raise.
+TOLERANCE = 1E-12
+STATIONS = 501
+P01, T0 = 1E6, 300.
+
+# Thresholds of the nozzle below: pl = 0.957, pns = 0.448, pd = 0.0684.
+_NOZZLE = WindTunnel(2.4, 0.24, P01, 300., 20., 5., 5., 1., 0.99E6)
+PL, PNS, PD = [float(v) for v in _NOZZLE.thresholds]
+
+# Changes applied in order, with the working condition they lead to.
+STEPS = [('change_back_pressure', 0.99E6, 1),
+         ('change_back_pressure', PD*P01, 6),
+         ('change_back_pressure', 0.7E6, 3),
+         ('change_back_pressure', 0.99E6, 1),
+         ('change_p01', 1.005E6, 1),
+         ('change_t0', 400., 1),
+         ('change_back_pressure', PL*1.005E6, 2),
+         ('change_back_pressure', 0.2E6, 5),
+         ('change_p01', P01, 5),
+         ('change_back_pressure', PNS*P01, 4),
+         ('change_back_pressure', 0.05E6, 7),
+         ('change_back_pressure', PD*P01, 6),
+         ('change_t0', T0, 6)]
+
+
+def _build(pb, p01, t0, diffuser=True):
+    nozzle = WindTunnel(2.4, 0.24, p01, t0, 20., 5., 5., 1., pb)
+    com = Combination(nozzle)
+    com.add_test_section(5.)
+    if diffuser:
+        com.add_diffuser(0.17, 5., 5., 5., pb)
+    return com
+
+
+def _upstream(com, func, x):
+    # Value at station x of the nozzle or test section of com, without
+    # going through the diffuser that com lacks.
+    if x <= com.n_len:
+        return getattr(com._nozzle, func)(x)
+    return getattr(com._ts, func)(x-com.n_len)
+
+
+def _compare(name, value, expected):
+    value, expected = np.asarray(value, float), np.asarray(expected, float)
+    error = np.max(np.abs(value-expected) / np.maximum(1, np.abs(expected)))
+    if not error <= TOLERANCE:
+        raise AssertionError('%s is off the rebuilt combination by %.3g' %
+                             (name, error))
+
+
+def _raises(name, func):
+    try:
+        func()
+    except InvalidWorkingCondition:
+        return
+    raise AssertionError('%s did not raise InvalidWorkingCondition' % name)
+
+
+def test_changes():
+    com = _build(0.99E6, P01, T0)
+    pb, p01, t0 = 0.99E6, P01, T0
+    for change, value, wc in STEPS:
+        getattr(com, change)(value)
+        if change == 'change_back_pressure':
+            pb = value
+        elif change == 'change_p01':
+            p01 = value
+        else:
+            t0 = value
+        step = '%s(%r)' % (change, value)
+        nozzle = _build(pb, p01, t0, diffuser=False)._nozzle
+        if nozzle.wc != wc:
+            raise AssertionError('%s leads to working condition %d, not %d' %
+                                 (step, nozzle.wc, wc))
+
+        if wc in DIFFUSER_WCS:
+            ref = _build(pb, p01, t0)
+            xs = np.linspace(0, ref.t_len, STATIONS)
+            _compare(step + ' profile', com.profile(xs), ref.profile(xs))
+            for x in (1., 7., 12., 17.):
+                _compare('%s x2m(%r)' % (step, x), com.x2m(x), ref.x2m(x))
+                _compare('%s x2p(%r)' % (step, x), com.x2p(x), ref.x2p(x))
+            if com.parameters != ref.parameters:
+                raise AssertionError('%s parameters differ' % step)
+        else:
+            # Nozzle and test section stations still work.
+            ref = _build(pb, p01, t0, diffuser=False)
+            xs = np.linspace(0, ref.n_ts_len, STATIONS)
+            expected = [_upstream(ref, 'x2m', x) for x in xs.tolist()]
+            _compare(step + ' x2m', com.x2m(xs), expected)
+            for x in (1., 7., 12.):
+                _compare('%s x2m(%r)' % (step, x), com.x2m(x),
+                         _upstream(ref, 'x2m', x))
+                _compare('%s x2t(%r)' % (step, x), com.x2t(x),
+                         _upstream(ref, 'x2t', x))
+            x_d = com.n_ts_len + 1.
+            _raises(step + ' diffuser x2m', lambda: com.x2m(x_d))
+            _raises(step + ' profile',
+                    lambda: com.profile(np.linspace(0, com.t_len, 11)))
+            _raises(step + ' components', lambda: com.components)
+            _raises(step + ' parameters', lambda: com.parameters)
+
+
+if __name__ == '__main__':
+    test_changes()
+    print('Changed combinations match rebuilt ones.')
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+import isentropic_flow as ise_flow
+
+
+# The closed forms and newton must agree with the brentq reference to within
+# TOLERANCE in Mach number, for arrays and for scalars over MACH_RANGE.
+TOLERANCE = 1E-10
+MACH_RANGE = (1E-2, 5.)
+ARRAY_POINTS = 1000
+SCALAR_POINTS = 50
+
+INVERSES = [('p2m', ise_flow.p2m, ise_flow.m2p),
+            ('rho2m', ise_flow.rho2m, ise_flow.m2rho),
+            ('t2m', ise_flow.t2m, ise_flow.m2t),
+            ('ap2m', ise_flow.ap2m,
+             lambda m: ise_flow.m2a(m)*ise_flow.m2p(m))]
+
+
+def _check(name, method, ms, inverse, forward):
+    ys = forward(ms)
+    reference = inverse(ys, method='brentq')
+    error = np.max(np.abs(inverse(ys, method=method)-reference))
+    if not error <= TOLERANCE:
+        raise AssertionError('%s(method=%r) is off brentq by %.3g' %
+                             (name, method, error))
+
+
+def _check_scalars(name, method, ms, inverse, forward):
+    for m in ms.tolist():
+        y = float(forward(m))
+        value = inverse(y, method=method)
+        if np.ndim(value):
+            raise AssertionError('%s(method=%r) returned an array for a '
+                                 'scalar' % (name, method))
+        error = abs(value-inverse(y, method='brentq'))
+        if not error <= TOLERANCE:
+            raise AssertionError('%s(method=%r) is off brentq by %.3g at '
+                                 'M = %r' % (name, method, error, m))
+
+
+def test_arrays():
+    ms = np.linspace(MACH_RANGE[0], MACH_RANGE[1], ARRAY_POINTS)
+    for name, inverse, forward in INVERSES:
+        for method in ('analytic', 'newton'):
+            _check(name, method, ms, inverse, forward)
+
+
+def test_scalars():
+    ms = np.linspace(MACH_RANGE[0], MACH_RANGE[1], SCALAR_POINTS)
+    for name, inverse, forward in INVERSES:
+        for method in ('analytic', 'newton'):
+            _check_scalars(name, method, ms, inverse, forward)
+
+
+if __name__ == '__main__':
+    test_arrays()
+    test_scalars()
+    print('The inverses agree with brentq to within %g.' % TOLERANCE)
@@ -3,12 +3,17 @@
 
 from __future__ import absolute_import, division
 
-from common import Model
+import numpy as np
+
+from common import Model, FlowProfile
 
 
 # TODO: Refinement needed.
 class TestSection(Model):
 
+    PARAMETERS = ('in_mach', 'in_area', 'in_p', 'in_t', 'p01', 't01', 'z_len',
+                  't_len')
+
     def __init__(self,
                  in_mach,
                  in_area,
@@ -27,6 +32,14 @@ class TestSection(Model):
         self._z_len = z_len
         self._t_len = t_len
 
+    def change_inlet(self, in_mach, in_p, in_t, p01, t01):
+        self._in_mach = in_mach
+        self._in_p = in_p
+        self._in_t = in_t
+        self._p01 = p01
+        self._t01 = t01
+        self.changed()
+
     @property
     def t_len(self):
         return self._t_len
@@ -55,6 +68,10 @@ class TestSection(Model):
     def p02(self):
         return self.p01
 
+    @property
+    def breakpoints(self):
+        return np.array([0, self.t_len])
+
     def x2a(self, x):
         return self._in_area
 
@@ -75,4 +92,15 @@ class TestSection(Model):
         return self.in_t / self.t01
 
     def x2rho(self, x):
-        return self.x2p(x) / (self.x2t(x)) ** -1
+        return self.x2p(x) / self.x2t(x)
+
+    def profile(self, xs, method=None):
+        x = np.asarray(xs, float)
+        one = np.ones(x.shape)
+        return FlowProfile(x,
+                           self.x2a(x) * one,
+                           self.x2y(x) * one,
+                           self.x2m(x) * one,
+                           self.x2p(x) * one,
+                           self.x2t(x) * one,
+                           self.x2rho(x) * one)
@@ -6,15 +6,24 @@
 
 from __future__ import absolute_import, division
 
+from collections import namedtuple
+
 import numpy as np
-from scipy.optimize import brentq
 
 
 
 import isentropic_flow as ise_flow
 import normal_shock_wave as nsw
-from constants import EPSILON, R
-from common import Model, View, Controller
+from instrument import instrumented
+from gas import AIR
+from common import Model, View, Controller, FlowProfile, cached, classify
+
+
+# Working condition, throat area for a subsonic nozzle, and for a normal
+# shock in the nozzle: total pressure ratio, throat area behind the shock,
+# Mach number in front of it and its location.
+OperatingState = namedtuple('OperatingState',
+                            'ratio wc astar p02p01 a2star m1 xns')
 
 
 class WindTunnelNotBuild(Exception):
@@ -26,7 +35,10 @@ class InvalidCall(Exception):
 
 
 class WindTunnel(Model):
-    
+
+    PARAMETERS = ('design_mach', 'test_section_area', 'p01', 't0', 'in_area',
+                  'con_len', 'div_len', 'z_len', 'back_pressure')
+
     def __init__(self,
                  design_mach,
                  test_section_area,
@@ -36,7 +48,8 @@ class WindTunnel(Model):
                  con_len,
                  div_len,
                  z_len,
-                 back_pressure):
+                 back_pressure,
+                 gas=AIR):
 
         # Properties specified by the designer of the wind tunnel
         self._design_mach = design_mach
@@ -48,12 +61,17 @@ class WindTunnel(Model):
         self._div_len = div_len
         self._z_len = z_len
         self._back_pressure = back_pressure
+        self._gas = gas
 
         self._working_condition = None
 
     ##########################################################################
     # Properties decided by designer.
 
+    @property
+    def gas(self):
+        return self._gas
+
     @property
     def design_mach(self):
         return self._design_mach
@@ -86,11 +104,11 @@ class WindTunnel(Model):
     def z_len(self):
         return self._z_len
 
-    @property
+    @cached('geometry')
     def atsat(self):
-        return ise_flow.m2a(self.md)
+        return ise_flow.m2a(self.md, gas=self.gas)
 
-    @property
+    @cached('geometry')
     def throat_area(self):
         return self.ats / self.atsat
 
@@ -139,23 +157,35 @@ class WindTunnel(Model):
 
     ##########################################################################
     # Methods to change working condition.
+    #
+    # Derived properties are cached in two groups: 'geometry' is never
+    # invalidated, 'pressure' depends on pb and p01. None of them depends
+    # on t0. Nothing is recomputed until it is asked for.
 
     def change_back_pressure(self, p):
         self._back_pressure = p
-        self._working_condition = self.get_working_condition()
+        self._working_condition = None
+        self.changed('pressure')
 
     def change_p01(self, p0):
         self._p01 = p0
-        self._working_condition = self.get_working_condition()
+        self._working_condition = None
+        self.changed('pressure')
 
     def change_t0(self, t0):
         self._t0 = t0
-        self._working_condition = self.get_working_condition()
+        self.changed()
 
     ##########################################################################
     # Methods to calculate flow properties at given x.
 
     def x2a(self, x):
+        if np.ndim(x):
+            x = np.asarray(x, float)
+            return np.where(
+                x <= self.con_len,
+                (self.ain*self.con_len-self.ain*x+self.at*x) / self.con_len,
+                (self.ats-self.at)*(x-self.con_len)/self.div_len + self.at)
         if x <= self.con_len:
             area = (self.ain*self.con_len-self.ain*x+self.at*x) / self.con_len
         elif self.con_len < x <= self.con_len + self.div_len:
@@ -165,34 +195,41 @@ class WindTunnel(Model):
     def x2y(self, x):
         return self.x2a(x) / self.z_len / 2
 
-    @property
+    @cached('pressure')
     def mts_34(self):
-        return ise_flow.ap2m(self.ap_34)
+        return ise_flow.ap2m(self.ap_34, gas=self.gas)
 
-    @property
+    @cached('pressure')
     def p02_34(self):
-        return self.pb / ise_flow.m2p(self.mts_34)
+        return self.pb / ise_flow.m2p(self.mts_34, gas=self.gas)
 
-    @property
+    @cached('pressure')
     def p02_34p01(self):
         return self.p02_34 / self.p01
 
-    @property
+    @cached('pressure')
     def a2star_34(self):
         return (self.ap_34/(self.pb/self.p02_34)/self.ats) ** -1
 
-    @property
+    @cached('pressure')
     def m1_34(self):
-        return nsw.p02m(self.p02_34p01)
+        return nsw.p02m(self.p02_34p01, gas=self.gas)
 
-    @property
+    @cached('pressure')
     def ap_34(self):
         return self.atsat * self.pb / self.p01
 
-    @property
+    @cached('pressure')
     def xns_34(self):
-        area = ise_flow.m2a(self.m1_34) * self.at
-        return self.a2x(area, 0)
+        return self.shock_location(self.m1_34, self.wc)
+
+    def shock_location(self, m1, wc):
+        # Station of the normal shock with Mach number m1 in front of it.
+        # In working condition 4 it is at the exit by definition, otherwise
+        # rounding could put it on either side.
+        area = ise_flow.m2a(m1, gas=self.gas) * self.at
+        x = self.a2x(np.minimum(area, self.ats), 0)
+        return np.where(np.equal(wc, 4), self.t_len, x)[()]
 
     @property
     def p02(self):
@@ -201,47 +238,109 @@ class WindTunnel(Model):
         elif self.wc in (3, 4):
             return self.p02_34
 
+    @instrumented('WindTunnel.x2m')
     def x2m(self, x):
+        if np.ndim(x):
+            return self.profile(x).m
         if self.wc in (1, 2):
             aastar = self.x2a(x) / self.get_astar_if_subsonic()
-            m = ise_flow.a2m(aastar, supersonic=0)
+            m = ise_flow.a2m(aastar, supersonic=0, gas=self.gas)
 
         elif self.wc in (3, 4):
             if 0 <= x <= self.con_len:
-                m = ise_flow.a2m(self.x2a(x)/self.at, supersonic=0)
+                m = ise_flow.a2m(self.x2a(x)/self.at, supersonic=0,
+                                 gas=self.gas)
             elif self.con_len <= x <= self.xns_34:
-                m = ise_flow.a2m(self.x2a(x)/self.at, supersonic=1)
+                m = ise_flow.a2m(self.x2a(x)/self.at, supersonic=1,
+                                 gas=self.gas)
             elif self.xns_34 < x <= self.t_len:
-                m = ise_flow.a2m(self.x2a(x)/self.a2star_34, supersonic=0)
+                m = ise_flow.a2m(self.x2a(x)/self.a2star_34, supersonic=0,
+                                 gas=self.gas)
         
         elif self.wc in (5, 6, 7):
             if 0 <= x <= self.con_len:
-                m = ise_flow.a2m(self.x2a(x)/self.at, 0)
+                m = ise_flow.a2m(self.x2a(x)/self.at, 0, gas=self.gas)
             elif self.con_len <= x <= self.t_len:
-                m = ise_flow.a2m(self.x2a(x)/self.at, 1)
+                m = ise_flow.a2m(self.x2a(x)/self.at, 1, gas=self.gas)
         return m
 
+    def x2p02p01(self, x):
+        # Total pressure ratio across the normal shock, 1 in front of it.
+        if self.wc in (3, 4) and self.xns_34 < x <= self.t_len:
+            return self.p02_34p01
+        return 1
+
+    @instrumented('WindTunnel.x2p')
     def x2p(self, x):
-        if self.wc in (1, 2, 5, 6, 7):
-            p = ise_flow.m2p(self.x2m(x))
-        elif self.wc in (3, 4):
-            if 0 <= x <= self.xns_34:
-                p = ise_flow.m2p(self.x2m(x))
-            elif self.xns_34 < x <= self.t_len:
-                p = ise_flow.m2p(self.x2m(x)) * self.p02_34 / self.p01
-        return p
+        if np.ndim(x):
+            return self.profile(x).p
+        return ise_flow.m2p(self.x2m(x), gas=self.gas) * self.x2p02p01(x)
 
+    @instrumented('WindTunnel.x2rho')
     def x2rho(self, x):
-        return self.x2p(x) / (self.x2t(x)) ** -1
+        if np.ndim(x):
+            return self.profile(x).rho
+        return ise_flow.m2rho(self.x2m(x), gas=self.gas) * self.x2p02p01(x)
 
+    @instrumented('WindTunnel.x2t')
     def x2t(self, x):
-        return ise_flow.m2t(self.x2m(x))
+        if np.ndim(x):
+            return self.profile(x).t
+        return ise_flow.m2t(self.x2m(x), gas=self.gas)
+
+    @instrumented('WindTunnel.profile')
+    def profile(self, xs, method=None):
+        # method is passed on to ise_flow.a2m, e.g. 'continuation' to march
+        # along sorted stations.
+        x = np.asarray(xs, float)
+        a = self.x2a(x)
+        m = np.empty(x.shape)
+        p02p01 = np.ones(x.shape)
 
+        if self.wc in (1, 2):
+            m[...] = ise_flow.a2m(a/self.get_astar_if_subsonic(), 0, method,
+                                  gas=self.gas)
+        else:
+            # One Mach solve per station, batched by region.
+            con = x <= self.con_len
+            m[con] = ise_flow.a2m(a[con]/self.at, 0, method, gas=self.gas)
+            if self.wc in (3, 4):
+                xns = self.xns_34
+                sup = ~con & (x <= xns)
+                sub = ~con & (x > xns)
+                m[sup] = ise_flow.a2m(a[sup]/self.at, 1, method, gas=self.gas)
+                m[sub] = ise_flow.a2m(a[sub]/self.a2star_34, 0, method,
+                                      gas=self.gas)
+                p02p01[sub] = self.p02_34p01
+            elif self.wc in (5, 6, 7):
+                m[~con] = ise_flow.a2m(a[~con]/self.at, 1, method,
+                                       gas=self.gas)
+
+        return FlowProfile(x,
+                           a,
+                           a / self.z_len / 2,
+                           m,
+                           ise_flow.m2p(m, gas=self.gas) * p02p01,
+                           ise_flow.m2t(m, gas=self.gas),
+                           ise_flow.m2rho(m, gas=self.gas) * p02p01)
+
+    @property
+    def breakpoints(self):
+        # Stations where the profile has a kink or a jump.
+        xs = [0, self.con_len, self.t_len]
+        if self.wc in (3, 4):
+            xs.append(self.xns_34)
+        return np.unique(xs)
+
+    @instrumented('WindTunnel.a2x')
     def a2x(self, a, front=1):
+        # The walls are straight, so x2a inverts in closed form.
+        a = np.asarray(a, float)
         if front:
-            return brentq(lambda x: self.x2a(x)-a, 0, self.con_len)
+            x = (self.ain-a) * self.con_len / (self.ain-self.at)
         else:
-            return brentq(lambda x: self.x2a(x)-a, self.con_len, self.t_len)
+            x = (a-self.at)*self.div_len/(self.ats-self.at) + self.con_len
+        return x[()]
     
     def get_wall_shape(self):
         yin = self.x2y(0)
@@ -260,46 +359,75 @@ class WindTunnel(Model):
             self._working_condition = self.get_working_condition()
         return self._working_condition
 
-    def get_working_condition(self):
+    @cached('geometry')
+    def thresholds(self):
         # Mach number for the limiting case.
-        ml = ise_flow.a2m(self.atsat, 0)
+        ml = ise_flow.a2m(self.atsat, 0, gas=self.gas)
         # Mach number for the design case.
         md = self.md
 
-        pl = ise_flow.m2p(ml)
-        pd = ise_flow.m2p(md)
-        pns = ise_flow.m2p(md) * nsw.m2p(md)
-
-        ratio = self.pb / self.p01
-        if ratio > pl:
-            wc = 1
-        elif abs(ratio-pl) < EPSILON:
-            wc = 2
-        elif pns < ratio < pl:
-            wc = 3
-        elif abs(ratio-pns) < EPSILON:
-            wc = 4
-        elif pd < ratio < pns:
-            wc = 5
-        elif abs(ratio-pd) < EPSILON:
-            wc = 6
-        elif ratio < pd:
-            wc = 7
-        return wc
+        pl = ise_flow.m2p(ml, gas=self.gas)
+        pd = ise_flow.m2p(md, gas=self.gas)
+        pns = ise_flow.m2p(md, gas=self.gas) * nsw.m2p(md, gas=self.gas)
+        return pl, pns, pd
+
+    def classify(self, pb_over_p01):
+        return classify(pb_over_p01, *self.thresholds)
+
+    def get_working_condition(self):
+        return self.classify(self.pb/self.p01)
+
+    def operating_state(self, pb_over_p01):
+        # The pressure dependent quantities for an array of pb/p01, nan
+        # where they do not apply.
+        ratio = np.asarray(pb_over_p01, float)
+        wc = self.classify(ratio)
+        astar, p02p01, a2star, m1, xns = [np.full(ratio.shape, np.nan)
+                                          for _ in range(5)]
+
+        sub = (wc == 1) | (wc == 2)
+        astar[sub] = self.ats / ise_flow.m2a(
+            ise_flow.p2m(ratio[sub], gas=self.gas), gas=self.gas)
+
+        shock = (wc == 3) | (wc == 4)
+        ap = self.atsat * ratio[shock]
+        p02p01[shock] = ratio[shock] / ise_flow.m2p(
+            ise_flow.ap2m(ap, gas=self.gas), gas=self.gas)
+        a2star[shock] = self.ats * ratio[shock] / p02p01[shock] / ap
+        m1[shock] = nsw.p02m(p02p01[shock], gas=self.gas)
+        xns[shock] = self.shock_location(m1[shock], wc[shock])
+        return OperatingState(ratio, wc, astar, p02p01, a2star, m1, xns)
+
+    @instrumented('WindTunnel.pb_for_shock_at')
+    def pb_for_shock_at(self, x, method=None):
+        # Back pressure that puts the normal shock at x, for a scalar or an
+        # array of stations in the divergent part, nan elsewhere. The shock
+        # relations are walked back from x, so only the two Mach number
+        # inversions are solved. method is passed on to ise_flow.a2m.
+        x = np.asarray(x, float)
+        inside = (self.con_len <= x) & (x <= self.t_len)
+        pb = np.full(x.shape, np.nan)
+        a = self.x2a(x[inside])
+        m1 = ise_flow.a2m(a/self.at, 1, method, gas=self.gas)
+        p02p01 = nsw.m2p0(m1, gas=self.gas)
+        me = ise_flow.a2m(self.ats*p02p01/self.at, 0, method, gas=self.gas)
+        pb[inside] = self.p01 * p02p01 * ise_flow.m2p(me, gas=self.gas)
+        return pb[()]
 
     def get_in_mach(self):
-        case = self.get_working_condition()
+        case = self.wc
         if case == 1 or case == 2:
             astar = self.get_astar_if_subsonic()
-            in_mach = ise_flow.a2m(self.ain/astar, supersonic=0)
+            in_mach = ise_flow.a2m(self.ain/astar, supersonic=0, gas=self.gas)
         elif case == 3:
-            in_mach = ise_flow.a2m(self.ainat, supersonic=1)
+            in_mach = ise_flow.a2m(self.ainat, supersonic=1, gas=self.gas)
         return in_mach
 
     def get_astar_if_subsonic(self):
-        case = self.get_working_condition()
-        if not case == 1 or case == 2:
+        case = self.wc
+        if case not in (1, 2):
             raise InvalidCall
 
-        return self.ats / ise_flow.m2a(ise_flow.p2m(self.pb/self.p01))
+        return self.ats / ise_flow.m2a(
+            ise_flow.p2m(self.pb/self.p01, gas=self.gas), gas=self.gas)
 